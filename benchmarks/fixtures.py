@@ -0,0 +1,237 @@
+"""Deterministic stand-ins for hltv.org pages, shaped after the elements every extractor reads.
+Recorded pages can be used instead, see FixturePages(path=...).
+"""
+import os
+import random
+from datetime import date, timedelta
+
+TEAMS = [(4608 + i, slug) for i, slug in enumerate([
+    "natus-vincere", "faze", "vitality", "g2", "heroic", "outsiders", "liquid", "cloud9",
+    "ninjas-in-pyjamas", "fnatic", "astralis", "mouz", "ence", "big", "furia", "complexity",
+])]
+MAPS = ["mirage", "inferno", "nuke", "overpass", "vertigo", "ancient", "anubis"]
+EVENTS = ["iem katowice 2023", "blast premier spring groups 2023", "esl pro league season 17",
+          "pgl major antwerp 2022", "iem cologne 2022", "blast premier fall final 2022"]
+# path prefix -> fixture name, checked in order
+ROUTES = (
+    ("/stats/teams/matches/", "team_matches"),
+    ("/stats/teams/maps/", "team_maps"),
+    ("/stats/teams/players/", "team_players"),
+    ("/stats/teams/events/", "team_events"),
+    ("/betting/analytics/", "analytics"),
+    ("/matches/", "match"),
+    ("/matches", "listing"),
+)
+
+
+def route(path):
+    for prefix, name in ROUTES:
+        if path.startswith(prefix):
+            return name
+    return None
+
+
+def _page(body, filler):
+    """Wraps body into a page with `filler` unrelated blocks around it, real pages are mostly navigation and news"""
+    blocks = "".join(f'<div class="newsline"><a href="/news/{i}/item-{i}" class="article">'
+                     f'<span class="newstext">news item number {i} with some text</span>'
+                     f'<img src="/img/{i}.png" alt="{i}"></a></div>' for i in range(filler))
+    return (f'<!DOCTYPE html><html><head><title>HLTV.org</title></head><body>'
+            f'<div class="navbar">{blocks[:len(blocks) // 2]}</div>'
+            f'<div class="contentCol">{body}</div>'
+            f'<div class="footer">{blocks[len(blocks) // 2:]}</div></body></html>')
+
+
+def _match_teams(match_id):
+    return TEAMS[match_id % len(TEAMS)], TEAMS[(match_id + 1) % len(TEAMS)]
+
+
+def _display(slug):
+    return slug.replace("-", " ").title()
+
+
+def match_slug(match_id):
+    (_, team1), (_, team2) = _match_teams(match_id)
+    return f"{team1}-vs-{team2}-iem-katowice-2023"
+
+
+def listing_page(match_ids, live=2, unix=1676206800000):
+    entries = []
+    for match_id in match_ids:
+        (tid1, team1), (tid2, team2) = _match_teams(match_id)
+        entries.append(
+            f'<div class="upcomingMatch" data-zonedgrouping-entry-unix="{unix}" team1="{tid1}" team2="{tid2}">'
+            f'<a href="/matches/{match_id}/{match_slug(match_id)}" class="match a-reset">'
+            f'<div class="matchInfo"><div class="matchTime" data-unix="{unix}">14:00</div></div>'
+            f'<div class="matchTeams text-ellipsis">'
+            f'<div class="matchTeam team1"><div class="matchTeamName text-ellipsis">{_display(team1)}</div></div>'
+            f'<div class="matchTeam team2"><div class="matchTeamName text-ellipsis">{_display(team2)}</div></div>'
+            f'</div><div class="matchEvent"><div class="matchEventName">IEM Katowice 2023</div></div></a></div>')
+    lives = "".join(
+        f'<div class="liveMatch"><a href="/matches/{match_id}/{match_slug(match_id)}" class="match a-reset">'
+        f'<div class="matchTeamName text-ellipsis">{_display(_match_teams(match_id)[0][1])}</div></a></div>'
+        for match_id in range(1, live + 1))
+    body = (f'<div class="liveMatchesSection">{lives}</div>'
+            f'<div class="upcomingMatchesSection"><div class="matchDay">{"".join(entries)}</div></div>')
+    return _page(body, filler=200)
+
+
+def match_page(match_id, unix=1676206800000):
+    team1, team2 = _match_teams(match_id)
+    teams = "".join(
+        f'<div class="team"><div class="team{i + 1}-gradient"><a href="/team/{tid}/{slug}">'
+        f'<img class="logo" src="/logo/{tid}.svg"><div class="teamName">{_display(slug)}</div></a></div></div>'
+        for i, (tid, slug) in enumerate((team1, team2)))
+    body = (f'<div class="teamsBox">{teams}'
+            f'<div class="timeAndEvent"><div class="time" data-unix="{unix}">14:00</div>'
+            f'<div class="date" data-unix="{unix}">12th of February 2023</div>'
+            f'<div class="event text-ellipsis"><a href="/events/1/x">IEM Katowice 2023</a></div></div></div>'
+            f'<a class="matchpage-analytics-center-container" '
+            f'href="/betting/analytics/{match_id}/{match_slug(match_id)}">Analytics center</a>')
+    return _page(body, filler=400)
+
+
+def analytics_page(match_id):
+    rng = random.Random(match_id)
+    insights = ""
+    for i in range(2):
+        plus, minus = rng.randint(1, 3), rng.randint(0, 2)
+        icons = '<i class="fa fa-plus"></i>' * plus + '<i class="fa fa-minus"></i>' * minus
+        items = "".join(f'<div class="analytics-insights-insight">Insight {j} about team {i + 1}</div>'
+                        for j in range(plus + minus))
+        insights += f'<div class="analytics-insights-container team{i + 1}">{icons}{items}</div>'
+    head_to_head = ""
+    for i in range(2):
+        rows = "".join(f'<tr><td><span class="player-nickname">player{i}{p}</span></td>'
+                       f'<td class="table-3-months">{rng.uniform(0.8, 1.4):.2f}</td>'
+                       f'<td class="table-event">{rng.uniform(0.8, 1.4):.2f}</td></tr>' for p in range(5))
+        head_to_head += (f'<div class="table-container"><table><tr><th>Player</th>'
+                         f'<th class="table-3-months">3 months</th><th class="table-event">Event</th></tr>'
+                         f'{rows}</table></div>')
+    pick_ban = ""
+    for map_name in MAPS:
+        for i in range(2):
+            name = f'<td><div class="analytics-map-name">{map_name.title()}</div></td>' if i == 0 else '<td></td>'
+            pick_ban += (f'<tr>{name}<td class="analytics-map-stats-pick-percentage">{rng.randint(0, 60)}%</td>'
+                         f'<td class="analytics-map-stats-ban-percentage">{rng.randint(0, 60)}%</td>'
+                         f'<td class="analytics-map-stats-win-percentage">{rng.randint(0, 100)}%</td>'
+                         f'<td class="analytics-map-stats-played">{rng.randint(0, 20)}</td>'
+                         f'<td><span class="analytics-map-stats-comment">First pick</span></td></tr>')
+    body = (f'<div class="analytics-insights">{insights}</div>'
+            f'<div class="analytics-head-to-head">{head_to_head}</div>'
+            f'<div class="table-container gtSmartphone-only"><table><thead><tr><th>Map</th></tr></thead>'
+            f'<tbody>{pick_ban}</tbody></table></div>')
+    return _page(body, filler=300)
+
+
+def team_matches_page(team_id, rows=1500):
+    rng = random.Random(team_id)
+    table = ""
+    for i in range(rows):
+        group = 1 + (i // 3) % 2
+        first = " first" if i % 3 == 0 else ""
+        # about two maps a day going back from today, so every time filter window has rows
+        played = date.today() - timedelta(days=i // 2)
+        opponent = TEAMS[rng.randrange(len(TEAMS))][1]
+        ours, theirs = (16, rng.randint(0, 14)) if rng.random() < 0.55 else (rng.randint(0, 14), 16)
+        table += (f'<tr class="group-{group}{first}"><td class="time"><a href="/stats/matches/mapstatsid/{team_id * 100000 + i}/x-vs-y">'
+                  f'{played.strftime("%d/%m/%y")}</a></td>'
+                  f'<td><a href="/events/{i}"><span>{EVENTS[rng.randrange(len(EVENTS))]}</span></a></td>'
+                  f'<td><img class="eventLogo" src="/e.png"></td>'
+                  f'<td><img class="flag" src="/f.png"><a href="/stats/teams/1/x">{_display(opponent)}</a></td>'
+                  f'<td class="statsMapPlayed"><span>{MAPS[rng.randrange(len(MAPS))].title()}</span></td>'
+                  f'<td class="statsDetail"><span>{ours} - {theirs}</span></td>'
+                  f'<td class="text-center">{"W" if ours > theirs else "L"}</td></tr>')
+    body = (f'<table class="stats-table no-sort"><thead><tr><th>Date</th><th>Event</th><th></th><th>Opponent</th>'
+            f'<th>Map</th><th>Result</th><th>W/L</th></tr></thead><tbody>{table}</tbody></table>')
+    return _page(body, filler=150)
+
+
+def team_maps_page(team_id):
+    rng = random.Random(team_id)
+    names, stats = "", ""
+    for map_name in MAPS:
+        wins, draws, losses = rng.randint(0, 40), 0, rng.randint(0, 40)
+        names += f'<div class="map-pool-map-holder"><div class="map-pool-map-name">{map_name.title()} - 55.0%</div></div>'
+        values = (f"{wins} / {draws} / {losses}", f"{rng.uniform(20, 80):.1f}%", str(rng.randint(500, 3000)),
+                  f"{rng.uniform(60, 80):.1f}%", f"{rng.uniform(20, 40):.1f}%")
+        rows = "".join(f'<div class="stats-row"><span>Stat {i}</span><span>{value}</span></div>'
+                       for i, value in enumerate(values))
+        stats += f'<div class="col"><div class="stats-rows standard-box">{rows}</div></div>'
+    body = f'<div class="map-pool">{names}</div><div class="two-grid">{stats}</div>'
+    return _page(body, filler=150)
+
+
+def team_players_page(team_id):
+    rng = random.Random(team_id)
+    rows = "".join(f'<tr><td class="playerCol"><a href="/stats/players/{p}/x">player{p}</a></td>'
+                   f'<td>{rng.randint(50, 500)}</td><td>{rng.randint(1000, 9000):,}</td>'
+                   f'<td>{rng.randint(-200, 400):+d}</td><td>{rng.uniform(0.8, 1.4):.2f}</td>'
+                   f'<td>{rng.uniform(0.8, 1.4):.2f}</td></tr>' for p in range(9))
+    body = (f'<table class="stats-table player-ratings-table"><thead><tr><th>Player</th><th>Maps</th>'
+            f'<th>Rounds</th><th>K-D Diff</th><th>K/D</th><th>Rating</th></tr></thead><tbody>{rows}</tbody></table>')
+    return _page(body, filler=150)
+
+
+def team_events_page(team_id, rows=150):
+    rng = random.Random(team_id)
+    table = "".join(f'<tr><td>{rng.choice(["1st", "2nd", "3-4th", "5-8th", "9-12th"])}</td>'
+                    f'<td><a href="/events/{i}">{EVENTS[i % len(EVENTS)]} {i}</a></td></tr>' for i in range(rows))
+    body = (f'<table class="stats-table"><thead><tr><th>Placement</th><th>Event</th></tr></thead>'
+            f'<tbody>{table}</tbody></table>')
+    return _page(body, filler=150)
+
+
+class FixturePages:
+    """Serves page html by url path, either generated or recorded pages from path/<fixture name>.html"""
+
+    def __init__(self, path=None, match_ids=range(1, 41)):
+        self.path = path
+        self.match_ids = list(match_ids)
+        self._pages = {}
+
+    def page(self, url_path):
+        name = route(url_path)
+        if name is None:
+            return None
+        if self.path is not None or name == "listing":
+            key = name
+        else:
+            # /matches/<id>/<slug>, /betting/analytics/<id>/<slug>, /stats/teams/<kind>/<id>/<slug>
+            key = (name, int(url_path.split("/")[-2]))
+        if key not in self._pages:
+            self._pages[key] = self.__build(key)
+        return self._pages[key]
+
+    def __build(self, key):
+        if self.path is not None:
+            with open(os.path.join(self.path, f"{key}.html"), "r", encoding="utf-8") as fp:
+                return fp.read()
+        if key == "listing":
+            return listing_page(self.match_ids)
+        name, item_id = key
+        return {
+            "match": match_page,
+            "analytics": analytics_page,
+            "team_matches": team_matches_page,
+            "team_maps": team_maps_page,
+            "team_players": team_players_page,
+            "team_events": team_events_page,
+        }[name](item_id)
+
+    def save(self, path):
+        """Write one page of every fixture name to path, i.e. to edit them or replace with recorded pages"""
+        os.makedirs(path, exist_ok=True)
+        tid, slug = TEAMS[0]
+        samples = {
+            "listing": "/matches",
+            "match": f"/matches/1/{match_slug(1)}",
+            "analytics": f"/betting/analytics/1/{match_slug(1)}",
+            "team_matches": f"/stats/teams/matches/{tid}/{slug}",
+            "team_maps": f"/stats/teams/maps/{tid}/{slug}",
+            "team_players": f"/stats/teams/players/{tid}/{slug}",
+            "team_events": f"/stats/teams/events/{tid}/{slug}",
+        }
+        for name, url_path in samples.items():
+            with open(os.path.join(path, f"{name}.html"), "w", encoding="utf-8") as fp:
+                fp.write(self.page(url_path))
@@ -0,0 +1,192 @@
+"""Benchmarks for every extractor and for a full parse_upcoming_matches() crawl, served from fixture pages
+without any request to hltv.org. Run from repository root:
+
+    python -m benchmarks.run --iterations 20 --matches 40 --workers 8 --json bench.json
+    python -m benchmarks.run --features lxml --no-partial
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from loguru import logger
+from hltv_stats import (HLTVMatch, HLTVTeam, ResponseCache, TeamStatsMemo, configure_fetch, configure_parser,
+                        configure_store, get_links_upcoming_matches, get_session, parse_upcoming_matches)
+from .fixtures import TEAMS, FixturePages, match_slug
+
+BASE_URL = "https://www.hltv.org"
+
+
+class FixtureCache(ResponseCache):
+    """Offline cache answering every url with its fixture page, so only parsing and extraction are measured"""
+
+    def __init__(self, pages, path):
+        super().__init__(path, offline=True)
+        self.pages = pages
+
+    def get(self, url):
+        return self.pages.page(urlsplit(url).path)
+
+    def put(self, url, text):
+        pass
+
+
+class LocalAdapter(HTTPAdapter):
+    """Transport adapter sending hltv.org requests to the local fixture server"""
+
+    def __init__(self, base_url, **kwargs):
+        self.base_url = base_url
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(BASE_URL, self.base_url, 1)
+        return super().send(request, **kwargs)
+
+
+def _handler(pages, counter):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            text = pages.page(urlsplit(self.path).path)
+            with counter["lock"]:
+                counter["requests"] += 1
+            if text is None:
+                self.send_error(404)
+                return
+            body = text.encode("utf-8")
+            counter["bytes"] += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return FixtureHandler
+
+
+def measure(func, iterations):
+    """Returns timings of func() called iterations times and peak memory of one more call"""
+    func()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.mean(timings) * 1000,
+        "pages_per_second": len(timings) / sum(timings),
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def bench_extractors(pages, iterations, cache_dir):
+    """Every case fetches (from FixtureCache) and parses exactly one page"""
+    configure_fetch(cache=FixtureCache(pages, cache_dir))
+    tid, slug = TEAMS[0]
+    match_url = f"/matches/1/{match_slug(1)}"
+    match = HLTVMatch(match_url)
+    team = HLTVTeam(f"/{tid}/{slug}")
+    cases = [
+        ("matches listing", lambda: get_links_upcoming_matches()),
+        ("match page", lambda: HLTVMatch(match_url).teams_link),
+        ("analytics center", lambda: match.parse_analytics_center()),
+        ("team matches (all time)", lambda: team.parse_matches(0)),
+        ("team maps", lambda: team.parse_maps(3)),
+        ("team players", lambda: team.parse_players(3)),
+        ("team events", lambda: team.parse_events(3)),
+    ]
+    results = {name: measure(func, iterations) for name, func in cases}
+    configure_fetch(cache=None)
+    return results
+
+
+def bench_crawl(pages, months, workers):
+    """Full parse_upcoming_matches() run against local http server standing in for hltv.org"""
+    counter = {"requests": 0, "bytes": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(pages, counter))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    adapter = LocalAdapter(f"http://127.0.0.1:{server.server_address[1]}",
+                           pool_connections=workers, pool_maxsize=workers)
+    get_session().mount(BASE_URL, adapter)
+    try:
+        start = time.perf_counter()
+        parse_upcoming_matches(months=months, with_teams=True, workers=workers, memo=TeamStatsMemo())
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "seconds": elapsed,
+        "requests": counter["requests"],
+        "megabytes": counter["bytes"] / 2 ** 20,
+        "pages_per_second": counter["requests"] / elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per extractor")
+    parser.add_argument("--matches", type=int, default=40, help="upcoming matches in crawl listing")
+    parser.add_argument("--months", type=int, nargs="+", default=[1, 3, 6], help="time filters of crawl")
+    parser.add_argument("--workers", type=int, default=8, help="crawl concurrency")
+    parser.add_argument("--features", default="html.parser", help="BeautifulSoup tree builder, i.e. lxml")
+    parser.add_argument("--no-partial", action="store_true", help="build whole documents instead of parts")
+    parser.add_argument("--fixtures", help="directory with recorded <fixture name>.html pages")
+    parser.add_argument("--save-fixtures", help="write generated fixture pages to directory and exit")
+    parser.add_argument("--skip-crawl", action="store_true", help="benchmark extractors only")
+    parser.add_argument("--json", help="write results to json file")
+    args = parser.parse_args(argv)
+
+    pages = FixturePages(args.fixtures, match_ids=range(1000, 1000 + args.matches))
+    if args.save_fixtures:
+        pages.save(args.save_fixtures)
+        return
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    configure_parser(features=args.features, partial=not args.no_partial)
+    configure_fetch(rate=1e9, burst=1e9, max_per_host=args.workers)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # configs and output/ of the crawl go to temporary directory
+        os.chdir(tmp)
+        try:
+            configure_store(os.path.join(tmp, "configs", "hltv.sqlite3"))
+            results = {"extractors": bench_extractors(pages, args.iterations, os.path.join(tmp, "cache"))}
+            if not args.skip_crawl:
+                results["crawl"] = bench_crawl(pages, args.months, args.workers)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'extractor':<26}{'median ms':>12}{'mean ms':>12}{'pages/s':>12}{'peak KiB':>12}")
+    for name, result in results["extractors"].items():
+        print(f"{name:<26}{result['median_ms']:>12.2f}{result['mean_ms']:>12.2f}"
+              f"{result['pages_per_second']:>12.1f}{result['peak_memory_kb']:>12.0f}")
+    if "crawl" in results:
+        crawl = results["crawl"]
+        print(f"\ncrawl: {crawl['requests']} requests, {crawl['megabytes']:.1f} MiB in {crawl['seconds']:.2f} s, "
+              f"{crawl['pages_per_second']:.1f} pages/s")
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
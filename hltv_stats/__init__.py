@@ -1,10 +1,39 @@
-from .parser import *
-from .team import *
-from .match import *
-from .upcoming_matches import *
-from loguru import logger
-import sys
-logger.add(sys.stdout, format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}", level="INFO", backtrace=True, diagnose=True)
+import importlib
 
+# public names by module, modules (and requests, bs4, pandas behind them) are imported on first attribute access
+_EXPORTS = {
+    ".instrumentation": ("Metrics", "metrics"),
+    ".cache": ("CacheMiss", "CachedResponse", "ResponseCache"),
+    ".session": ("TokenBucket", "FetchError", "CircuitOpenError", "CircuitBreaker", "AIMDController",
+                 "RETRY_STATUSES", "THROTTLE_STATUSES", "configure_fetch", "get_session", "fetch"),
+    ".parser": ("class_strainer", "Parser", "configure_parser"),
+    ".store": ("ConfigStore", "configure_store", "get_store"),
+    ".memo": ("TeamStatsMemo",),
+    ".sinks": ("JSONLSink", "ParquetSink"),
+    ".records": ("MatchRecord", "MapRecord", "PlayerRecord", "EventRecord", "InsightRecord", "PickBanRecord",
+                 "HeadToHeadRecord", "RECORD_TYPES", "to_records"),
+    ".history": ("MatchHistory",),
+    ".team": ("STATS_KINDS", "DERIVABLE_KINDS", "TABLES_ONLY", "MAPS_PAGE_ONLY", "HLTVTeam"),
+    ".match": ("MATCH_PAGE_ONLY", "ANALYTICS_PAGE_ONLY", "ANALYTICS_KINDS", "MATCH_ATTRIBUTES", "HLTVMatch"),
+    ".upcoming_matches": ("BASE_URL", "LISTING_ONLY", "get_upcoming_matches", "get_links_upcoming_matches",
+                          "output_paths", "parse_upcoming_matches"),
+    ".dataset": ("ANALYTICS_FILE", "TEAM_FILE", "DatasetBuilder"),
+    ".jobs": ("JOB_KINDS", "LeaseLost", "Job", "JobQueue", "enqueue_upcoming_matches", "JOB_HANDLERS", "run_worker"),
+    ".watcher": ("MatchWatcher",),
+    "loguru": ("logger",),
+}
+_MODULES = {name: module for module, names in _EXPORTS.items() for name in names}
+__all__ = list(_MODULES)
 
 
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
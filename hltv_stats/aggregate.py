@@ -0,0 +1,112 @@
+import re
+from datetime import datetime, timedelta
+
+# fields identifying parse_matches() rows stored before they had map_stats_id, two maps of a day may share them
+MATCH_KEY = ("date", "event", "opponent", "map", "result")
+
+
+def map_stats_id(href):
+    """Returns map stats id from link of matches table date cell, i.e. /stats/matches/mapstatsid/158063/x-vs-y"""
+    found = re.search(r"\d+", href or "")
+    return found.group(0) if found is not None else None
+
+
+def row_date(row):
+    """Returns date of a parse_matches() row, hltv shows dates as dd/mm/yy"""
+    return datetime.strptime(row["date"].strip(), "%d/%m/%y").date()
+
+
+def unique_rows(matches):
+    """Drops repeated parse_matches() rows and orders them latest first.
+    Rows of `group-x first` class are matched by both `group-x first` and `group-x` lookups in parse_matches().
+    Rows are identified by map_stats_id, rows without it (older history) by MATCH_KEY fields.
+    """
+    seen_ids, seen_fields = set(), set()
+    output = []
+    for row in matches:
+        row_id = row.get("map_stats_id")
+        fields = tuple(row[field] for field in MATCH_KEY)
+        if (row_id in seen_ids) if row_id is not None else (fields in seen_fields):
+            continue
+        seen_ids.add(row_id)
+        seen_fields.add(fields)
+        output.append(row)
+    return sorted(output, key=_sort_date, reverse=True)
+
+
+def _sort_date(row):
+    try:
+        return row_date(row)
+    except ValueError:
+        return datetime.min.date()
+
+
+def filter_window(matches, months, now=None):
+    """Keeps parse_matches() rows played within last `months` months, same window as HLTVTeam time filter
+    :param matches: list of dicts from parse_matches()
+    :param months: int, 0 - all time, 1 - last month, 3 - last 3 months, ...
+    :param now: datetime, end of the window, defaults to now
+    :return: list of dicts
+    """
+    if months == 0:
+        return list(matches)
+    now = now or datetime.now()
+    start = (now - timedelta(days=int(30 * months))).date()
+    window = []
+    for row in matches:
+        try:
+            if row_date(row) >= start:
+                window.append(row)
+        except ValueError:
+            continue
+    return window
+
+
+def _scores(row):
+    scores = [int(_) for _ in re.findall(r"\d+", row["result"])]
+    return scores[0], scores[1]
+
+
+def row_outcome(row):
+    """Returns 'w', 'd' or 'l' for parse_matches() row"""
+    flag = row["flag"].strip().lower()
+    if flag in ("w", "l"):
+        return flag
+    if flag in ("d", "t"):
+        return "d"
+    ours, theirs = _scores(row)
+    return "w" if ours > theirs else "l" if ours < theirs else "d"
+
+
+def map_stats(matches):
+    """Derives per map records from parse_matches() rows, most played maps first.
+    Only fields computable from matches table are returned, first kill/death round win rates are not.
+    :return: list of dicts with map, wins_draws_losses, win_rate and total_rounds
+    """
+    maps = {}
+    for row in matches:
+        record = maps.setdefault(row["map"], {"w": 0, "d": 0, "l": 0, "rounds": 0})
+        record[row_outcome(row)] += 1
+        try:
+            record["rounds"] += sum(_scores(row))
+        except IndexError:
+            pass
+    output = []
+    for name, record in sorted(maps.items(), key=lambda _: -(_[1]["w"] + _[1]["d"] + _[1]["l"])):
+        played = record["w"] + record["d"] + record["l"]
+        output.append({
+            "map": name,
+            "wins_draws_losses": f"{record['w']} / {record['d']} / {record['l']}",
+            "win_rate": f"{100 * record['w'] / played:.1f}%",
+            "total_rounds": str(record["rounds"]),
+        })
+    return output
+
+
+def event_stats(matches):
+    """Derives list of events from parse_matches() rows, latest first.
+    Placements are not part of matches table and are not returned.
+    :return: list of dicts with event
+    """
+    events = dict.fromkeys(row["event"] for row in sorted(matches, key=_sort_date, reverse=True))
+    return [{"event": event} for event in events]
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when requested url is not cached"""
+
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response served from ResponseCache"""
+
+    def __init__(self, url, text, status_code=200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.from_cache = True
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+
+class ResponseCache:
+    """Stores raw HTML of successful responses on disk, keyed by url including query string.
+    Freshness window is picked by the first ttl rule whose regex matches url path and query.
+    """
+    DEFAULT_TTL = [
+        (r"^/stats/teams/", 6 * 60 * 60),  # team stats pages, filtered by __get_time_filter
+        (r"^/betting/analytics/", 30 * 60),  # analytics center
+        (r"^/matches/\d+", 30 * 60),  # single match page
+        (r"^/matches/?$", 5 * 60),  # upcoming matches listing
+    ]
+
+    def __init__(self, path="./cache/http", ttl=None, default_ttl=10 * 60, offline=False):
+        """
+        :param path: str, directory for cached pages
+        :param ttl: list of (regex, seconds) rules checked before DEFAULT_TTL
+        :param default_ttl: int, seconds for urls not matched by any rule
+        :param offline: bool, serve only from cache ignoring freshness, never touch network
+        """
+        self.path = path
+        self.rules = [(re.compile(pattern), seconds) for pattern, seconds in (ttl or []) + self.DEFAULT_TTL]
+        self.default_ttl = default_ttl
+        self.offline = offline
+        os.makedirs(self.path, exist_ok=True)
+
+    def ttl_for(self, url) -> float:
+        parts = urlsplit(url)
+        target = parts.path + ("?" + parts.query if parts.query else "")
+        for pattern, seconds in self.rules:
+            if pattern.search(target):
+                return seconds
+        return self.default_ttl
+
+    def _file(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, key[:2], key + ".html")
+
+    def get(self, url):
+        """Returns cached html for url or None if it is missing or stale"""
+        path = self._file(url)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if not self.offline and age > self.ttl_for(url):
+                return None
+            with open(path, "r", encoding="utf-8") as fp:
+                return fp.read()
+        except OSError:
+            return None
+
+    def put(self, url, text):
+        path = self._file(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        os.replace(tmp_path, path)
@@ -0,0 +1,204 @@
+"""Command line interface: crawl upcoming matches, share crawl between workers with job queue or watch listing.
+
+    hltv-stats crawl --months 1 3 --with-teams --workers 8 --cache ./cache/http --format jsonl
+    hltv-stats enqueue --months 1 3 --with-teams && hltv-stats work --workers 4
+    hltv-stats watch --lead-time 1800 --poll 300 --with-teams
+    hltv-stats crawl --with-teams --profile ./profile/crawl  # writes crawl.prof and crawl.txt
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from loguru import logger
+
+
+def _common_arguments():
+    common = argparse.ArgumentParser(add_help=False)
+    group = common.add_argument_group("crawl")
+    group.add_argument("--months", type=int, nargs="+", default=[3], help="time filters of team stats, 0 - all time")
+    group.add_argument("--with-teams", action="store_true", help="parse teams' statistic as well")
+    group.add_argument("--derive-windows", action="store_true",
+                       help="filter matches of all months from one all-time matches request per team")
+    group.add_argument("--derive-kinds", nargs="+", choices=("maps", "events"), default=(),
+                       help="with --derive-windows, derive these stats from matches table instead of requesting "
+                            "them per month, maps lose first kill/death round win rates and events lose placement")
+    group.add_argument("--memo", help="directory keeping parsed team stats between runs")
+    group.add_argument("--history", help="directory with all-time matches synced incrementally, "
+                                         "used with --derive-windows")
+    group.add_argument("--store", help="sqlite file of parsed matches and teams, ./configs/hltv.sqlite3 by default")
+    group = common.add_argument_group("output")
+    group.add_argument("--format", choices=("json", "jsonl", "parquet"), default="json",
+                       help="json files in ./output/matches and ./output/teams, or records streamed to --output")
+    group.add_argument("--output", default="./output", help="directory of jsonl/parquet records")
+    group = common.add_argument_group("fetch")
+    group.add_argument("--workers", type=int, default=1, help="matches/teams parsed concurrently")
+    group.add_argument("--rate", type=float, help="requests per second")
+    group.add_argument("--burst", type=float, help="requests allowed back to back after idle")
+    group.add_argument("--max-per-host", type=int, help="concurrent requests per host")
+    group.add_argument("--retries", type=int, help="retries of 429, 5xx and connection errors")
+    group.add_argument("--adaptive", action="store_true", help="lower rate on 429/503, raise it while healthy")
+    group.add_argument("--cache", help="directory caching raw html pages")
+    group.add_argument("--offline", action="store_true", help="serve pages from --cache only")
+    group.add_argument("--parser", help="BeautifulSoup tree builder, i.e. lxml")
+    group = common.add_argument_group("diagnostics")
+    group.add_argument("--log-level", default="INFO", help="loguru level of messages printed to stdout")
+    group.add_argument("--metrics", help="write fetch and parse metrics to json file")
+    group.add_argument("--profile", help="profile run with cProfile, writes <path>.prof and <path>.txt report")
+    return common
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = _common_arguments()
+    parser = argparse.ArgumentParser(prog="hltv-stats", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("crawl", parents=[common], help="parse upcoming matches once, see parse_upcoming_matches()")
+    for name, help_text in (("enqueue", "add upcoming matches to job queue"),
+                            ("work", "run queued jobs until queue is drained")):
+        command = commands.add_parser(name, parents=[common], help=help_text)
+        command.add_argument("--queue", default="./configs/jobs.sqlite3", help="sqlite file of job queue")
+        command.add_argument("--lease-time", type=int, default=300, help="seconds a job stays leased without heartbeat")
+    watch = commands.add_parser("watch", parents=[common], help="poll listing and fetch analytics before kickoff")
+    watch.add_argument("--lead-time", type=int, default=30 * 60, help="seconds before match start to fetch analytics")
+    watch.add_argument("--poll", type=int, default=5 * 60, help="seconds between listing requests")
+    watch.add_argument("--duration", type=float, help="stop after seconds, runs until interrupted by default")
+    return parser
+
+
+def _configure(args):
+    """Applies fetch, parser and store options, returns sink or None"""
+    from . import configure_fetch, configure_parser, configure_store, ResponseCache, JSONLSink, ParquetSink
+    logger.remove()
+    logger.add(sys.stdout, format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}", level=args.log_level)
+    fetch_options = {"rate": args.rate, "burst": args.burst, "max_per_host": args.max_per_host,
+                     "retries": args.retries, "adaptive": args.adaptive or None,
+                     "pool_size": args.workers if args.workers > 10 else None}
+    if args.cache is not None:
+        fetch_options["cache"] = ResponseCache(args.cache, offline=args.offline)
+    configure_fetch(**fetch_options)
+    if args.parser is not None:
+        configure_parser(features=args.parser)
+    if args.store is not None:
+        configure_store(args.store)
+    if args.format == "jsonl":
+        return JSONLSink(args.output)
+    if args.format == "parquet":
+        return ParquetSink(args.output)
+    return None
+
+
+def _derive_windows(args):
+    """Returns derive_windows option of parse_upcoming_matches()"""
+    if not args.derive_windows:
+        return False
+    return tuple(args.derive_kinds) or True
+
+
+def _run(args, sink):
+    from . import TeamStatsMemo, MatchHistory
+    memo = TeamStatsMemo(path=args.memo) if args.memo is not None else None
+    history = MatchHistory(args.history) if args.history is not None else None
+    if args.command == "crawl":
+        from . import parse_upcoming_matches
+        parse_upcoming_matches(args.months, with_teams=args.with_teams, workers=args.workers, memo=memo,
+                               derive_windows=_derive_windows(args), history=history, sink=sink)
+    elif args.command == "enqueue":
+        from . import JobQueue, enqueue_upcoming_matches
+        enqueue_upcoming_matches(JobQueue(args.queue, lease_time=args.lease_time), args.months,
+                                 with_teams=args.with_teams, derive_windows=_derive_windows(args))
+    elif args.command == "work":
+        from . import JobQueue, run_worker
+        run_worker(JobQueue(args.queue, lease_time=args.lease_time), workers=args.workers, memo=memo,
+                   history=history, sink=sink)
+    elif args.command == "watch":
+        from . import MatchWatcher
+        watcher = MatchWatcher(lead_time=args.lead_time, poll=args.poll, months=args.months,
+                               with_teams=args.with_teams, memo=memo, derive_windows=_derive_windows(args),
+                               history=history, sink=sink)
+        try:
+            watcher.run(duration=args.duration)
+        except KeyboardInterrupt:
+            watcher.stop()
+
+
+class _Profiler:
+    """cProfile of main thread and of every thread started while profiling (crawl workers).
+    Python 3.12+ allows one active profiler only, then worker threads are covered by metrics timings only.
+    """
+
+    def __init__(self):
+        import cProfile
+        self._cProfile = cProfile
+        self.main = cProfile.Profile()
+        self.threads = []
+
+    def _profile_thread(self, *args):
+        sys.setprofile(None)
+        profiler = self._cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return
+        self.threads.append(profiler)
+
+    def __enter__(self):
+        threading.setprofile(self._profile_thread)
+        self.main.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.main.disable()
+        threading.setprofile(None)
+
+    def report(self, path, seconds):
+        """Writes <path>.prof (open with pstats or snakeviz) and <path>.txt with top functions and metrics"""
+        import io
+        import pstats
+        from . import metrics
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        stats = pstats.Stats(self.main)
+        for profiler in self.threads:
+            stats.add(profiler)
+        stats.dump_stats(f"{path}.prof")
+        text = io.StringIO()
+        text.write(f"wall time: {seconds:.2f} s, profiled threads: {1 + len(self.threads)}\n\n")
+        snapshot = metrics.snapshot()
+        text.write(f"{'span':<40}{'count':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}\n")
+        for name, timing in sorted(snapshot["timings"].items(), key=lambda _: -_[1]["total"]):
+            text.write(f"{name:<40}{timing['count']:>8}{timing['total']:>10.2f}{timing['mean'] * 1000:>10.1f}"
+                       f"{timing['max'] * 1000:>10.1f}\n")
+        text.write("\n")
+        for name, value in sorted(snapshot["counters"].items()):
+            text.write(f"{name:<40}{value:>8}\n")
+        stats.stream = text
+        for sort in ("cumulative", "tottime"):
+            text.write(f"\n--- top functions by {sort} time ---\n")
+            stats.sort_stats(sort).print_stats(40)
+        with open(f"{path}.txt", "w") as fp:
+            fp.write(text.getvalue())
+        logger.info(f"Profile written to {path}.prof and {path}.txt")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.offline and args.cache is None:
+        parser.error("--offline serves pages from --cache only, --cache is required")
+    sink = _configure(args)
+    profiler = _Profiler() if args.profile else None
+    start = time.perf_counter()
+    try:
+        if profiler is not None:
+            with profiler:
+                _run(args, sink)
+        else:
+            _run(args, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+        if profiler is not None:
+            profiler.report(args.profile, time.perf_counter() - start)
+        if args.metrics:
+            from . import metrics
+            metrics.dump(args.metrics)
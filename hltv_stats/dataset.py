@@ -0,0 +1,268 @@
+import json
+import os
+import re
+from loguru import logger
+from .aggregate import MATCH_KEY
+from .match import ANALYTICS_KINDS
+from .team import STATS_KINDS
+
+ANALYTICS_FILE = re.compile(rf"^(\d+)_({'|'.join(ANALYTICS_KINDS)})\.json$")
+TEAM_FILE = re.compile(rf"^(\d+)_(.+)_({'|'.join(STATS_KINDS)})_stats\.json$")
+# kinds of records written to JSONLSink and ParquetSink by crawlers
+SINK_KINDS = (tuple(f"analytics_{kind}" for kind in ANALYTICS_KINDS) +
+              tuple(f"team_{kind}_stats" for kind in STATS_KINDS))
+
+
+class DatasetBuilder:
+    """Compiles crawl outputs into a prematch feature matrix, one row per match: analytics insights, pick/ban
+    and head to head ratings plus maps, players, matches and events stats of both teams per time filter,
+    as t1_*, t2_* and diff_* (t1 - t2) columns. Requires pandas (and pyarrow for parquet outputs).
+    Reads json files of matches/ and teams/ as well as <kind>.jsonl and <kind>/part-*.parquet of sinks.
+    Built rows are kept in path/ and only matches with new or changed records are rebuilt.
+    """
+
+    def __init__(self, output="./output", path="./dataset"):
+        """
+        :param output: str, directory with matches/ and teams/ json files or records of JSONLSink/ParquetSink
+        :param path: str, directory for built dataset and manifest of files it was built from
+        """
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("DatasetBuilder requires pandas, install it with `pip install pandas`")
+        self._pd = pandas
+        self.output = output
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _files(self) -> dict:
+        """Returns {file path: (match_id, kind, mtime, size)} of all crawl outputs,
+        match_id is None for sink files holding records of many matches
+        """
+        files = {}
+        for folder, pattern, kind_format in (("matches", ANALYTICS_FILE, "analytics_{}"),
+                                             ("teams", TEAM_FILE, "team_{}_stats")):
+            folder_path = os.path.join(self.output, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for entry in os.scandir(folder_path):
+                found = pattern.match(entry.name)
+                if found is not None:
+                    stat = entry.stat()
+                    files[entry.path] = (found.group(1), kind_format.format(found.group(found.lastindex)),
+                                         stat.st_mtime_ns, stat.st_size)
+        for kind in SINK_KINDS:
+            entries = []
+            jsonl_path = os.path.join(self.output, f"{kind}.jsonl")
+            if os.path.isfile(jsonl_path):
+                entries.append(jsonl_path)
+            parts_path = os.path.join(self.output, kind)
+            if os.path.isdir(parts_path):
+                entries.extend(entry.path for entry in os.scandir(parts_path)
+                               if entry.name.startswith("part-") and entry.name.endswith(".parquet"))
+            for entry_path in entries:
+                stat = os.stat(entry_path)
+                files[entry_path] = (None, kind, stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.path, "manifest.json"), "r") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self):
+        """Returns previously built dataset, empty DataFrame if nothing was built yet"""
+        dataset_path = os.path.join(self.path, "dataset.pkl")
+        if not os.path.exists(dataset_path):
+            return self._pd.DataFrame()
+        return self._pd.read_pickle(dataset_path)
+
+    def build(self, full=False):
+        """Builds dataset, rows of matches whose records did not change since previous build are reused
+        :param full: bool, if True, rebuild all matches
+        :return: pandas DataFrame indexed by match_id
+        """
+        pd = self._pd
+        files = self._files()
+        manifest = {} if full else self._read_manifest()
+        dataset = pd.DataFrame() if full else self.load()
+        # json files: [mtime, size], sink files: [mtime, size, match ids of their records, bytes read]
+        current = {}
+        changed = set()
+        for path, (match_id, kind, mtime, size) in files.items():
+            previous = manifest.get(path)
+            if previous is not None and previous[0:2] == [mtime, size]:
+                current[path] = previous
+                continue
+            if match_id is not None:
+                current[path] = [mtime, size]
+                changed.add(match_id)
+                continue
+            # jsonl sinks are appended to, only records added since previous build are read
+            start = previous[3] if previous is not None and path.endswith(".jsonl") and previous[3] <= size else 0
+            records, end = self._read_records(path, start)
+            added = {self._record_match_id(kind, row) for row in records} - {None}
+            changed |= added
+            current[path] = [mtime, size, sorted(added | set(previous[2] if start else [])), end]
+        for path, previous in manifest.items():
+            if path not in current:
+                changed |= set(previous[2]) if len(previous) > 2 else {os.path.basename(path).split("_")[0]}
+        present = {match_id for match_id, _, _, _ in files.values() if match_id is not None}
+        present |= {match_id for entry in current.values() if len(entry) > 2 for match_id in entry[2]}
+        removed = set(dataset.index) - present
+        if changed or removed:
+            dataset = dataset.drop(index=[_ for _ in changed | removed if _ in dataset.index])
+            logger.info(f"Building dataset rows of {len(changed)} matches, {len(dataset)} rows are reused")
+            paths = [path for path, (match_id, _, _, _) in files.items()
+                     if match_id in changed or (match_id is None and changed.intersection(current[path][2]))]
+            rows = self.features(self._load_frames([(path, files[path][0], files[path][1]) for path in paths],
+                                                   changed))
+            dataset = pd.concat([dataset, rows]) if len(dataset) else rows
+            dataset = dataset.sort_index()
+            dataset.to_pickle(os.path.join(self.path, "dataset.pkl"))
+        with open(os.path.join(self.path, "manifest.json"), "w") as fp:
+            json.dump(current, fp)
+        return dataset
+
+    @staticmethod
+    def _record_match_id(kind, row):
+        """Match of sink record, analytics rows have match_id, team rows parsed for a match have match_cuid"""
+        match_id = row.get("match_id") if kind.startswith("analytics_") else row.get("match_cuid")
+        return str(match_id) if match_id is not None else None
+
+    @staticmethod
+    def _read_records(path, start=0):
+        """Returns (records, bytes read) of ParquetSink part or of JSONLSink file from byte offset start,
+        last line of jsonl file is skipped while it is still being written
+        """
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Reading parquet outputs requires pyarrow, install it with `pip install pyarrow`")
+            return pyarrow.parquet.read_table(path).to_pylist(), os.path.getsize(path)
+        records = []
+        with open(path, "rb") as fp:
+            fp.seek(start)
+            end = start
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                if line.strip():
+                    records.append(json.loads(line))
+        return records, end
+
+    def _load_frames(self, files, match_ids) -> dict:
+        """Loads files into one long DataFrame per kind, rows are tagged with match_id,
+        records of sink files are kept only for match_ids
+        """
+        rows = {}
+        for path, match_id, kind in files:
+            if match_id is not None:
+                with open(path, "r") as fp:
+                    rows.setdefault(kind, []).extend(dict(row, match_id=match_id) for row in json.load(fp))
+                continue
+            for row in self._read_records(path)[0]:
+                record_match_id = self._record_match_id(kind, row)
+                if record_match_id in match_ids:
+                    rows.setdefault(kind, []).append(dict(row, match_id=record_match_id))
+        return {kind: self._pd.DataFrame(data) for kind, data in rows.items()}
+
+    def _numeric(self, series):
+        return self._pd.to_numeric(series.astype(str).str.replace(r"[%,+\s]", "", regex=True), errors="coerce")
+
+    def features(self, frames: dict):
+        """Returns feature matrix indexed by match_id from long DataFrames of crawl outputs by sink kind"""
+        pd = self._pd
+        key = ["match_id", "team"]
+        per_team = []
+        insights = frames.get("analytics_insights")
+        if insights is not None:
+            per_team.append(insights.assign(insights_plus=insights["indicator"] == "plus",
+                                            insights_minus=insights["indicator"] == "minus")
+                            .groupby(key)[["insights_plus", "insights_minus"]].sum())
+        head_to_head = frames.get("analytics_players_stats")
+        if head_to_head is not None:
+            head_to_head = head_to_head.rename(columns={"player_team": "team"}).assign(
+                rating_3_months=lambda _: self._numeric(_["table_3_months"]),
+                rating_event=lambda _: self._numeric(_["table_event"]))
+            grouped = head_to_head.groupby(key)
+            per_team.append(pd.DataFrame({"h2h_rating_3_months_mean": grouped["rating_3_months"].mean(),
+                                          "h2h_rating_3_months_min": grouped["rating_3_months"].min(),
+                                          "h2h_rating_3_months_max": grouped["rating_3_months"].max(),
+                                          "h2h_rating_event_mean": grouped["rating_event"].mean()}))
+        pick_ban = frames.get("analytics_maps_stats")
+        if pick_ban is not None:
+            values = {name: self._numeric(pick_ban[f"analytics_map_stats_{name}"])
+                      for name in ("pick_percentage", "ban_percentage", "win_percentage", "played")}
+            pick_ban = pick_ban[key + ["analytics_map_name"]].assign(**values)
+            per_team.append(self._pivot(pick_ban, key, "analytics_map_name", list(values), "analytics"))
+        team_maps = frames.get("team_maps_stats")
+        if team_maps is not None:
+            team_maps = team_maps.assign(win_rate=self._numeric(team_maps["win_rate"]),
+                                         total_rounds=self._numeric(team_maps["total_rounds"]),
+                                         window=team_maps["time_filter"].astype(str) + "m")
+            per_team.append(self._pivot(team_maps, key, ["map", "window"], ["win_rate", "total_rounds"], "maps"))
+        players = frames.get("team_players_stats")
+        if players is not None:
+            players = players.assign(rating=self._numeric(players["rating"]), kd=self._numeric(players["kd"]),
+                                     window=players["time_filter"].astype(str) + "m")
+            per_team.append(self._pivot(players, key, "window", ["rating", "kd"], "players", aggfunc="mean"))
+        matches = frames.get("team_matches_stats")
+        if matches is not None:
+            # parse_matches() returns some rows twice, see unique_rows()
+            identity = ["map_stats_id"] if "map_stats_id" in matches else []
+            matches = matches.drop_duplicates(key + ["time_filter"] + list(MATCH_KEY) + identity)
+            scores = matches["result"].str.split("-", n=1, expand=True)
+            matches = matches.assign(win=(matches["flag"].str.strip() == "W").astype(float),
+                                     round_diff=self._numeric(scores[0]) - self._numeric(scores[1]),
+                                     window=matches["time_filter"].astype(str) + "m")
+            grouped = matches.groupby(key + ["window"])
+            summary = pd.DataFrame({"count": grouped.size(), "win_rate": grouped["win"].mean(),
+                                    "round_diff_mean": grouped["round_diff"].mean()}).unstack("window")
+            summary.columns = [f"matches_{name}_{window}" for name, window in summary.columns]
+            per_team.append(summary)
+        events = frames.get("team_events_stats")
+        if events is not None:
+            events = events.assign(window=events["time_filter"].astype(str) + "m")
+            summary = events.groupby(key + ["window"]).size().unstack("window")
+            summary.columns = [f"events_count_{window}" for window in summary.columns]
+            per_team.append(summary)
+        if not per_team:
+            return pd.DataFrame()
+        teams = pd.concat(per_team, axis=1)
+        teams = teams.join(self._sides(frames), how="inner").reset_index()
+        wide = teams.set_index(["match_id", "side"]).unstack("side")
+        wide.columns = [f"t{side + 1}_{name}" for name, side in wide.columns]
+        numeric = [name for name in teams.columns if name not in ("match_id", "team", "side")]
+        diffs = pd.DataFrame({f"diff_{name}": wide.get(f"t1_{name}") - wide.get(f"t2_{name}")
+                              for name in numeric if f"t1_{name}" in wide and f"t2_{name}" in wide},
+                             index=wide.index)
+        return pd.concat([wide, diffs], axis=1)
+
+    def _pivot(self, frame, key, columns, values, prefix, aggfunc="mean"):
+        """Wide per-team frame with one column per value and pivoted columns, i.e. maps_win_rate_mirage_3m"""
+        table = frame.pivot_table(index=key, columns=columns, values=values, aggfunc=aggfunc)
+        table.columns = [f"{prefix}_" + "_".join(str(_) for _ in column) for column in table.columns]
+        return table
+
+    def _sides(self, frames):
+        """Side (0 for team1, 1 for team2) of every team per match_id, in order teams appear on analytics page,
+        teams of matches without analytics are ordered by name
+        """
+        pd = self._pd
+        teams = []
+        for kind, column in (("analytics_insights", "team"), ("analytics_maps_stats", "team"),
+                             ("analytics_players_stats", "player_team")):
+            if kind in frames:
+                teams.append(frames[kind][["match_id", column]].rename(columns={column: "team"}))
+        stats = [frames[f"team_{kind}_stats"][["match_id", "team"]] for kind in STATS_KINDS
+                 if f"team_{kind}_stats" in frames]
+        if stats:
+            teams.append(pd.concat(stats).drop_duplicates().sort_values(["match_id", "team"]))
+        teams = pd.concat(teams).drop_duplicates()
+        teams = teams.assign(side=teams.groupby("match_id").cumcount())
+        return teams[teams["side"] < 2].set_index(["match_id", "team"])["side"]
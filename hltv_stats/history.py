@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from .aggregate import unique_rows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock of path between processes, blocks until lock is acquired"""
+    with open(path, "a+") as fp:
+        if fcntl is not None:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        else:
+            fp.seek(0)
+            msvcrt.locking(fp.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+            else:
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class MatchHistory:
+    """Stores all-time parse_matches() rows per team_cuid together with the last synced date,
+    used by HLTVTeam.sync_matches() to request only matches played since previous sync.
+    Merges are locked per team_cuid, so one directory can be shared by threads and processes.
+    """
+
+    def __init__(self, path="./history"):
+        """
+        :param path: str, directory with one json file per team_cuid
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, team_cuid):
+        return os.path.join(self.path, f"{team_cuid}.json")
+
+    def load(self, team_cuid):
+        """Returns (last synced date as YYYY-MM-DD or None, list of stored rows)"""
+        try:
+            with open(self._file(team_cuid), "r") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return None, []
+        return data["synced"], data["matches"]
+
+    def merge(self, team_cuid, rows, synced):
+        """Merges new rows into stored history dropping duplicates, returns merged history
+        :param rows: list of dicts from parse_matches()
+        :param synced: str, date as YYYY-MM-DD up to which history is complete
+        """
+        with self._lock, _file_lock(self._file(team_cuid) + ".lock"):
+            _, stored = self.load(team_cuid)
+            rows = [{k: v for k, v in row.items() if k != 'match_cuid'} for row in rows]
+            merged = unique_rows(rows + stored)
+            path = self._file(team_cuid)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as fp:
+                json.dump({"synced": synced, "matches": merged}, fp)
+            os.replace(tmp_path, path)
+        return merged
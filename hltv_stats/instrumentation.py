@@ -0,0 +1,91 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Thread-safe registry of counters and timings recorded by fetch layer and parse_* methods.
+    Read totals with snapshot(), or follow every fetch/span as it finishes with add_hook().
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._timings = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def failure(self, name, error):
+        """Count failure of name by exception type, i.e. team.parse_maps.failures.IndexError"""
+        self.count(f"{name}.failures")
+        self.count(f"{name}.failures.{type(error).__name__}")
+
+    def add_hook(self, hook):
+        """Register callable receiving every event dict: name, seconds, error and extra fields (i.e. url, status)"""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def emit(self, event):
+        for hook in list(self._hooks):
+            hook(event)
+
+    @contextmanager
+    def span(self, name, **fields):
+        """Times the block as name, failures are counted by exception type and re-raised"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            self.failure(name, e)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(name, seconds)
+            if self._hooks:
+                self.emit({"name": name, "seconds": seconds,
+                           "error": type(error).__name__ if error is not None else None, **fields})
+
+    def timed(self, name):
+        """Decorator wrapping every call of function into span(name)"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """Returns counters and timings (count, total, max and mean seconds) recorded so far"""
+        with self._lock:
+            timings = {name: dict(timing, mean=timing["total"] / timing["count"])
+                       for name, timing in self._timings.items()}
+            return {"counters": dict(self._counters), "timings": timings}
+
+    def dump(self, path):
+        with open(path, "w") as fp:
+            json.dump(self.snapshot(), fp, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._timings = {}
+
+
+metrics = Metrics()
@@ -0,0 +1,303 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import NamedTuple, Optional
+from loguru import logger
+from .instrumentation import metrics
+from .store import thread_connection
+
+# kinds of crawl jobs handled by run_worker()
+JOB_KINDS = ("match", "analytics", "team")
+
+
+class LeaseLost(Exception):
+    """Raised when job lease expired and job was taken over by another worker"""
+
+
+class Job(NamedTuple):
+    id: str
+    kind: str
+    payload: dict
+    attempts: int
+    owner: str
+    checkpoint: Optional[dict] = None
+
+
+class JobQueue:
+    """Persistent crawl queue in SQLite shared by worker threads and processes.
+    Jobs are leased for `lease_time` seconds, workers renew leases with heartbeat(), jobs of dead workers are
+    leased again once their lease expires and resume from their last checkpoint.
+    Leasing relies on sqlite file locks: workers of several machines may share the file on a network filesystem
+    (NFS, SMB) only if it implements POSIX locks reliably, otherwise one job can be leased twice or the database
+    can get corrupted; keep the queue on a local disk and run one queue per machine in that case.
+    """
+
+    def __init__(self, path="./configs/jobs.sqlite3", lease_time=300, max_attempts=3, retry_delay=60):
+        """
+        :param path: str, sqlite database file
+        :param lease_time: int, seconds a job stays leased without heartbeat
+        :param max_attempts: int, failed or expired jobs are retried until they were leased max_attempts times
+        :param retry_delay: int, seconds before failed job is leased again, multiplied by attempts
+        """
+        self.path = path
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, "
+            "lease_until REAL, available_at REAL NOT NULL DEFAULT 0, checkpoint TEXT, error TEXT, updated REAL)")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        return thread_connection(self._local, self.path)
+
+    def put(self, kind, payload, key=None) -> bool:
+        """Adds job, returns False if job with the same key was added before (in any status)
+        :param kind: str, one of JOB_KINDS
+        :param payload: json-serializable dict passed to job handler
+        :param key: str, unique job id, by default built from kind and payload
+        """
+        key = key or f"{kind}:{json.dumps(payload, sort_keys=True)}"
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO jobs (id, kind, payload, updated) VALUES (?, ?, ?, ?)",
+            (key, kind, json.dumps(payload), time.time()))
+        return cursor.rowcount == 1
+
+    def lease(self, owner, kinds=JOB_KINDS) -> Optional[Job]:
+        """Leases next available job to owner, returns None if no job is available right now"""
+        con = self._connection()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', owner = NULL, updated = ? "
+                        "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                        (now, now, self.max_attempts))
+            row = con.execute(
+                f"SELECT id, kind, payload, attempts, checkpoint FROM jobs "
+                f"WHERE kind IN ({', '.join('?' * len(kinds))}) AND ((status = 'pending' AND available_at <= ?) "
+                f"OR (status = 'leased' AND lease_until < ?)) ORDER BY available_at, rowid LIMIT 1",
+                (*kinds, now, now)).fetchone()
+            if row is not None:
+                con.execute("UPDATE jobs SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1, "
+                            "updated = ? WHERE id = ?", (owner, now + self.lease_time, now, row[0]))
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job_id, kind, payload, attempts, checkpoint = row
+        return Job(job_id, kind, json.loads(payload), attempts + 1, owner,
+                   json.loads(checkpoint) if checkpoint is not None else None)
+
+    def heartbeat(self, owner) -> int:
+        """Renews leases of all jobs leased by owner, returns number of renewed jobs"""
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE jobs SET lease_until = ?, updated = ? WHERE owner = ? AND status = 'leased'",
+            (now + self.lease_time, now, owner))
+        return cursor.rowcount
+
+    def checkpoint(self, job, data):
+        """Stores progress of leased job and renews its lease, resumed job gets it as job.checkpoint
+        :param data: json-serializable dict
+        """
+        now = time.time()
+        cursor = self._connection().execute(
+            "UPDATE jobs SET checkpoint = ?, lease_until = ?, updated = ? WHERE id = ? AND owner = ? "
+            "AND status = 'leased'", (json.dumps(data), now + self.lease_time, now, job.id, job.owner))
+        if cursor.rowcount != 1:
+            raise LeaseLost(job.id)
+
+    def complete(self, job):
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'done', owner = NULL, lease_until = NULL, error = NULL, updated = ? "
+            "WHERE id = ? AND owner = ? AND status = 'leased'", (time.time(), job.id, job.owner))
+        if cursor.rowcount != 1:
+            raise LeaseLost(job.id)
+
+    def fail(self, job, error):
+        """Releases job for retry after retry_delay, or marks it failed after max_attempts"""
+        now = time.time()
+        status = "failed" if job.attempts >= self.max_attempts else "pending"
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, available_at = ?, error = ?, updated = ? "
+            "WHERE id = ? AND owner = ? AND status = 'leased'",
+            (status, now + self.retry_delay * job.attempts, repr(error), now, job.id, job.owner))
+
+    def retry_failed(self) -> int:
+        """Moves failed jobs back to pending with attempts reset, returns their number"""
+        cursor = self._connection().execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, updated = ? WHERE status = 'failed'",
+            (time.time(),))
+        return cursor.rowcount
+
+    def active(self) -> int:
+        """Number of jobs not done or failed yet"""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def counts(self) -> dict:
+        """Returns {status: number of jobs}"""
+        return dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def enqueue_upcoming_matches(queue, months, with_teams=False, derive_windows=False, matches=None) -> int:
+    """Adds match job for every upcoming match, returns number of new jobs.
+    Crawl options are stored in jobs, so every worker parses them the same way.
+    :param queue: JobQueue
+    :param months: list of months to parse, i.e. [1,3] <=> [last month, last 3 months]
+    :param with_teams: bool, if True, match jobs add team stats jobs as well
+    :param derive_windows: bool or tuple of DERIVABLE_KINDS, see parse_upcoming_matches()
+    :param matches: list of HLTVMatch, by default get_upcoming_matches()
+    """
+    from .upcoming_matches import get_upcoming_matches
+    if matches is None:
+        matches = get_upcoming_matches()
+    added = sum(queue.put("match", {"url": match.match_url, "attributes": match.attributes(), "months": list(months),
+                                    "with_teams": with_teams,
+                                    "derive_windows": derive_windows},
+                          key=f"match:{match.match_url}")
+                for match in matches)
+    logger.info(f"Enqueued {added} new matches of {len(matches)}")
+    return added
+
+
+def _run_match(queue, job, output):
+    """Parses match page and adds analytics job and team jobs of the match"""
+    from .match import HLTVMatch
+    from .store import get_store
+    payload = job.payload
+    match = HLTVMatch(payload["url"], attributes=payload.get("attributes"))
+    if get_store().has_match(match.match_id):
+        logger.info(f"Match {match.match_id} already parsed, skipping")
+        return
+    queue.put("analytics", {"url": match.match_url, "attributes": match.attributes()},
+              key=f"analytics:{match.match_id}")
+    if payload["with_teams"]:
+        for team_link in match.teams_link:
+            queue.put("team", {"url": team_link, "match_id": match.match_id, "months": payload["months"],
+                               "derive_windows": payload["derive_windows"]},
+                      key=f"team:{match.match_id}:{team_link}")
+
+
+def _run_analytics(queue, job, output):
+    """Parses analytics center, match is stored as parsed only after its analytics were saved"""
+    from .match import HLTVMatch
+    match = HLTVMatch(job.payload["url"], attributes=job.payload["attributes"])
+    if output["sink"] is not None:
+        match.parse_analytics_center(sink=output["sink"])
+        output["sink"].after_flush(match.is_parsed)
+    else:
+        match.parse_analytics_center(filename=f"{output['matches_path']}/{match.match_id}")
+        match.is_parsed()
+
+
+def _run_team(queue, job, output):
+    """Parses stats windows of a team one by one, finished windows are checkpointed and not parsed again
+    after the job is resumed. All windows are saved at once when the last one is parsed.
+    """
+    from .team import HLTVTeam
+    payload = job.payload
+    team = HLTVTeam(payload["url"])
+    team.match_id = payload["match_id"]
+    windows = {int(m): stats for m, stats in ((job.checkpoint or {}).get("windows") or {}).items()}
+    if payload["derive_windows"]:
+        if len(windows) < len(payload["months"]):
+            derive = () if payload["derive_windows"] is True else tuple(payload["derive_windows"])
+            windows = team.window_stats(payload["months"], memo=output["memo"], history=output["history"],
+                                        derive=derive)
+    else:
+        for m in payload["months"]:
+            if m in windows:
+                continue
+            windows[m] = team.stats(m, memo=output["memo"])
+            queue.checkpoint(job, {"windows": windows})
+    windows = {m: windows[m] for m in payload["months"]}
+    if output["sink"] is not None:
+        team.save_windows(windows, sink=output["sink"])
+    else:
+        team.save_windows(windows, filename=f"{output['teams_path']}/{team.match_id}_"
+                                            f"{team.team_name.replace('-', '_')}")
+
+
+JOB_HANDLERS = {"match": _run_match, "analytics": _run_analytics, "team": _run_team}
+
+
+def run_worker(queue, workers=1, owner=None, memo=None, history=None, sink=None, poll=5):
+    """Runs queued crawl jobs until none is pending or leased, several workers may share one queue.
+    Output goes to the same output/ tree as parse_upcoming_matches().
+    :param queue: JobQueue
+    :param workers: int, jobs processed concurrently by this worker
+    :param owner: str, worker id stored with leased jobs, hostname:pid:random by default
+    :param memo: TeamStatsMemo, team stats are parsed once per worker by default
+    :param history: MatchHistory, see HLTVTeam.window_stats()
+    :param sink: JSONLSink or ParquetSink, if set, records are written to sink instead of json files in output/
+    :param poll: int, seconds to wait while all remaining jobs are leased by other workers
+    :return: dict of job status -> number of jobs in queue
+    """
+    from .memo import TeamStatsMemo
+    from .upcoming_matches import output_paths
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[0:8]}"
+    matches_path, teams_path = output_paths()
+    output = {"matches_path": matches_path, "teams_path": teams_path, "sink": sink,
+              "memo": memo if memo is not None else TeamStatsMemo(), "history": history}
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(queue.lease_time / 3):
+            queue.heartbeat(owner)
+
+    def complete(job):
+        try:
+            queue.complete(job)
+            metrics.count(f"jobs.{job.kind}.done")
+        except LeaseLost:
+            logger.info(f"Lease of {job.id} expired, job was taken over by another worker")
+
+    def work():
+        while True:
+            job = queue.lease(owner)
+            if job is None:
+                # jobs waiting for their buffered records stay leased, idle worker writes them out
+                if sink is not None:
+                    sink.flush()
+                if queue.active() == 0:
+                    return
+                time.sleep(poll)
+                continue
+            logger.info(f"Running {job.id} (attempt {job.attempts})")
+            try:
+                with metrics.span(f"job.{job.kind}", job=job.id):
+                    JOB_HANDLERS[job.kind](queue, job, output)
+                # job is done once its records are on disk, so they are not lost with this worker
+                if sink is not None:
+                    sink.after_flush(lambda job=job: complete(job))
+                else:
+                    complete(job)
+            except LeaseLost:
+                logger.info(f"Lease of {job.id} expired, job was taken over by another worker")
+            except Exception as e:
+                logger.info(f"Failed {job.id}: {e!r}")
+                queue.fail(job, e)
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    threads = [threading.Thread(target=work) for _ in range(max(1, workers))]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stopped.set()
+    counts = queue.counts()
+    logger.info(f"Worker {owner} finished, jobs: {counts}")
+    return counts
@@ -1,67 +1,183 @@
-import os
+import re
 from datetime import datetime, timedelta
-from .parser import Parser
+from .parser import Parser, class_strainer
+from .store import get_store
+from .records import InsightRecord, PickBanRecord, HeadToHeadRecord
+from .instrumentation import metrics
+from .session import FetchError
 from loguru import logger
 
 BASE_URL = "https://www.hltv.org"
+# page parts read by extractors, the rest of the document is not built while parsing
+MATCH_PAGE_ONLY = class_strainer("team1-gradient", "team2-gradient", "matchpage-analytics-center-container",
+                                 "timeAndEvent")
+ANALYTICS_PAGE_ONLY = class_strainer("analytics-insights-container", "table-container")
+# analytics center extractors in parse_analytics_center() order, used as json filename suffixes
+ANALYTICS_KINDS = ("insights", "maps_stats", "players_stats")
+
+
+# attributes read from match page, loaded on first access unless they were filled from /matches listing
+MATCH_ATTRIBUTES = ("teams_name", "teams_link", "analytics_center_link", "datetime", "timestamp")
+
+
+def _match_datetime(timestamp):
+    """Match time as stored in configs"""
+    return str(datetime.fromtimestamp(timestamp) - timedelta(hours=8))
+
+
+def _slug(title):
+    return re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+
+
+def _lazy_attribute(name):
+    def get(self):
+        if self._attributes.get(name) is None and not self._loaded:
+            self._load_attributes()
+        return self._attributes.get(name)
+
+    def set(self, value):
+        self._attributes[name] = value
+    return property(get, set)
 
 
 class HLTVMatch(Parser):
-    def __init__(self, url):
+    teams_name = _lazy_attribute("teams_name")
+    teams_link = _lazy_attribute("teams_link")
+    analytics_center_link = _lazy_attribute("analytics_center_link")
+    datetime = _lazy_attribute("datetime")
+    # match start as unix time in seconds
+    timestamp = _lazy_attribute("timestamp")
+
+    def __init__(self, url, attributes=None):
+        """Match page is requested only when one of MATCH_ATTRIBUTES is accessed and missing
+        :param url: str, match link, i.e. /matches/2370000/team-a-vs-team-b-event
+        :param attributes: dict from attributes() or from_listing(), known attributes are not parsed again
+        """
         self.match_url = url
         self.match_id = self.match_url.split('/')[2]
-        self.teams_name = None
-        self.teams_link = None
-        self.analytics_center_link = None
         self.match_maps = None
-        self.datetime = None
+        self._attributes = {}
+        self._loaded = False
+        for name, value in (attributes or {}).items():
+            setattr(self, name, tuple(value) if isinstance(value, list) else value)
+
+    @classmethod
+    def from_listing(cls, soup, include_live=True) -> list:
+        """Builds matches from /matches listing without requesting match pages. Time is read from listing,
+        team names only if match link confirms them, team links if listing has team ids. Analytics link is built
+        from match id and link, matches without analytics center answer 404 and are parsed without analytics.
+        Missing attributes are loaded from match page when accessed
+        :param soup: BeautifulSoup of /matches page
+        :param include_live: bool, include live matches
+        """
+        matches = []
+        for entry in soup.find("div", class_="upcomingMatchesSection").find_all('a', class_="match a-reset", href=True):
+            titles = entry.parent.find_all('div', class_="matchTeamName text-ellipsis")
+            if len(titles) < 2:
+                logger.info(entry['href'])
+                logger.info("Invalid match, waiting for teams")
+                continue
+            match = cls(entry['href'])
+            match_slug = match.match_url.split('/')[3]
+            match.analytics_center_link = f"{BASE_URL}/betting/analytics/{match.match_id}/{match_slug}"
+            names = tuple(_slug(_.text) for _ in titles[0:2])
+            if f"{match_slug}-".startswith(f"{names[0]}-vs-{names[1]}-"):
+                match.teams_name = names
+                if entry.parent.get("team1") and entry.parent.get("team2"):
+                    match.teams_link = (f"/{entry.parent['team1']}/{names[0]}", f"/{entry.parent['team2']}/{names[1]}")
+            unix = entry.parent.find(class_="matchTime", attrs={"data-unix": True})
+            if unix is not None:
+                match.timestamp = int(unix['data-unix'][0:-3])
+                match.datetime = _match_datetime(match.timestamp)
+            matches.append(match)
+        if include_live:
+            matches.extend(cls(_.a['href']) for _ in soup.find_all("div", class_="liveMatch"))
+        return matches
+
+    def _load_attributes(self):
+        """Loads attributes from match page, failed load is retried on next access"""
         self.__get_match_attributes()
+        self._loaded = True
 
+    @metrics.timed("match.get_match_attributes")
     def __get_match_attributes(self):
-        soup = self._soup_from_url(BASE_URL + self.match_url)
+        soup = self._soup_from_url(BASE_URL + self.match_url, MATCH_PAGE_ONLY)
         get_normed_link = lambda _: "/" + "/".join(_.split('/')[2:4])
         get_team_name = lambda _: _.split('/')[3]
         team1_link = soup.find("div", class_="team1-gradient").find('a')['href']
         team2_link = soup.find("div", class_="team2-gradient").find('a')['href']
-        analytics_link = soup.find("a", class_="matchpage-analytics-center-container")['href']
+        analytics_link = soup.find("a", class_="matchpage-analytics-center-container")
         self.teams_link = (get_normed_link(team1_link), get_normed_link(team2_link))
         self.teams_name = (get_team_name(team1_link), get_team_name(team2_link))
-        self.analytics_center_link = BASE_URL + analytics_link
-        timestamp = int(soup.find("div", class_="timeAndEvent").find(class_="time")['data-unix'][0:-3])
-        self.datetime = str(datetime.fromtimestamp(timestamp) - timedelta(hours=8))
+        self.analytics_center_link = BASE_URL + analytics_link['href'] if analytics_link is not None else None
+        self.timestamp = int(soup.find("div", class_="timeAndEvent").find(class_="time")['data-unix'][0:-3])
+        self.datetime = _match_datetime(self.timestamp)
+
+    def _analytics_soup(self):
+        """Returns soup of analytics center, None if match has none (no link on match page or 404)"""
+        if self.analytics_center_link is not None:
+            try:
+                return self._soup_from_url(self.analytics_center_link, ANALYTICS_PAGE_ONLY)
+            except FetchError as e:
+                if e.status_code != 404:
+                    raise
+        metrics.count("match.no_analytics")
+        logger.info(f"Match {self.match_id} has no analytics center")
+        return None
 
-    def parse_analytics_center(self, filename=None):
-        soup = self._soup_from_url(self.analytics_center_link)
+    @metrics.timed("match.parse_analytics_center")
+    def parse_analytics_center(self, filename=None, sink=None):
+        """ Parse insights, pick/ban stats and head to head stats from analytics center
+        :param filename: str, filename prefix for saving json
+        :param sink: JSONLSink or ParquetSink, records are written as analytics_<kind>, see ANALYTICS_KINDS
+        :return: tuple of list of dicts with stats, lists are empty if match has no analytics center
+        """
+        soup = self._analytics_soup()
+        if soup is None:
+            return tuple([] for _ in ANALYTICS_KINDS)
         output = []
-        try:
-            insights = self.parse_analytics_summary(soup)
-            output.append(insights)
-            if filename is not None:
-                self._write_to_json(insights, f"{filename}_insights.json")
-        except:
-            logger.info("Failed __parse_analytics_summary(), parsed match has non-regular data\n")
-        try:
-            map_stats = self.parse_pick_ban_stats(soup)
-            output.append(map_stats)
-            if filename is not None:
-                self._write_to_json(map_stats, f"{filename}_maps_stats.json")
-        except:
-            logger.info("Failed __parse_pick_ban_stats(), parsed match has non-regular data\n")
-        try:
-            players_stats = self.parse_head_to_head(soup)
-            output.append(players_stats)
-            if filename is not None:
-                self._write_to_json(players_stats, f"{filename}_players_stats.json")
-        except:
-            logger.info("Failed __parse_head_to_head(), parsed match has non-regular data\n")
+        extractors = (self.parse_analytics_summary, self.parse_pick_ban_stats, self.parse_head_to_head)
+        for kind, extractor in zip(ANALYTICS_KINDS, extractors):
+            try:
+                rows = extractor(soup)
+                output.append(rows)
+                if filename is not None:
+                    self._write_to_json(rows, f"{filename}_{kind}.json")
+                if sink is not None:
+                    sink.write(f"analytics_{kind}", rows)
+            except Exception as e:
+                logger.info(f"Failed {extractor.__name__}(), parsed match has non-regular data: {e!r}\n")
         return tuple(output)
 
-    def parse_analytics_summary(self, soup=None, filename=None):
+    def iter_analytics(self, soup=None):
+        """ Yields (kind, row) pairs from analytics center as they are parsed, kind is one of ANALYTICS_KINDS.
+        Extractor failing on non-regular data is skipped, rows it yielded before failing are kept.
+        """
         if not soup:
-            soup = Parser._soup_from_url(self.analytics_center_link)
+            soup = self._analytics_soup()
+            if soup is None:
+                return
+        extractors = (self.iter_analytics_summary, self.iter_pick_ban_stats, self.iter_head_to_head)
+        for kind, extractor in zip(ANALYTICS_KINDS, extractors):
+            try:
+                for row in extractor(soup):
+                    yield kind, row
+            except Exception as e:
+                metrics.failure(f"match.{extractor.__name__}", e)
+                logger.info(f"Failed {extractor.__name__}(), parsed match has non-regular data: {e!r}\n")
+
+    @metrics.timed("match.parse_analytics_summary")
+    def parse_analytics_summary(self, soup=None, filename=None, typed=False):
+        insights_stats = list(self.iter_analytics_summary(soup))
+        if filename is not None:
+            self._write_to_json(insights_stats, f"{filename}.json")
+        return [InsightRecord.from_row(row) for row in insights_stats] if typed else insights_stats
+
+    def iter_analytics_summary(self, soup=None):
+        if not soup:
+            soup = Parser._soup_from_url(self.analytics_center_link, ANALYTICS_PAGE_ONLY)
         normed = lambda x: list(map(lambda _: _.text.lower().strip(), x))
         # normed(soup.find('div', attrs={"class", "analytics-info fadeUp"}).find_all("div"))
-        insights_stats = []
         for i in range(2):
             container = soup.find(class_=f"analytics-insights-container team{i + 1}")
             plus_len = len(container.find_all(class_="fa fa-plus"))
@@ -77,15 +193,18 @@ class HLTVMatch(Parser):
                     "insight": insights[j],
                     "match_id": self.match_id
                 }
-                insights_stats.append(row_data)
+                yield row_data
+
+    @metrics.timed("match.parse_pick_ban_stats")
+    def parse_pick_ban_stats(self, soup=None, filename=None, typed=False):
+        map_stats = list(self.iter_pick_ban_stats(soup))
         if filename is not None:
-            self._write_to_json(insights_stats, f"{filename}.json")
-        return insights_stats
+            self._write_to_json(map_stats, f"{filename}.json")
+        return [PickBanRecord.from_row(row) for row in map_stats] if typed else map_stats
 
-    def parse_pick_ban_stats(self, soup=None, filename=None):
+    def iter_pick_ban_stats(self, soup=None):
         if not soup:
-            soup = Parser._soup_from_url(self.analytics_center_link)
-        map_stats = []
+            soup = Parser._soup_from_url(self.analytics_center_link, ANALYTICS_PAGE_ONLY)
         rows = soup.find(class_="table-container gtSmartphone-only").find("tbody").find_all('tr')
         for ind, row in enumerate(rows):
             if ind % 2 == 0:
@@ -106,15 +225,18 @@ class HLTVMatch(Parser):
                 "analytics_map_stats_comment": comment,
                 "match_id": self.match_id
             }
-            map_stats.append(row_data)
+            yield row_data
+
+    @metrics.timed("match.parse_head_to_head")
+    def parse_head_to_head(self, soup=None, filename=None, typed=False):
+        players_stats = list(self.iter_head_to_head(soup))
         if filename is not None:
-            self._write_to_json(map_stats, f"{filename}.json")
-        return map_stats
+            self._write_to_json(players_stats, f"{filename}.json")
+        return [HeadToHeadRecord.from_row(row) for row in players_stats] if typed else players_stats
 
-    def parse_head_to_head(self, soup=None, filename=None):
+    def iter_head_to_head(self, soup=None):
         if not soup:
-            soup = Parser._soup_from_url(self.analytics_center_link)
-        players_stats = []
+            soup = Parser._soup_from_url(self.analytics_center_link, ANALYTICS_PAGE_ONLY)
         team_container = soup.find_all(class_="table-container")  # [0] [1] teams=
         for i in range(2):
             nicknames = team_container[i].find_all(class_='player-nickname')
@@ -128,23 +250,13 @@ class HLTVMatch(Parser):
                     "table_event": event_stats[player].text,
                     "match_id": self.match_id
                 }
-                players_stats.append(player_data)
-        if filename is not None:
-            self._write_to_json(players_stats, f"{filename}.json")
-        return players_stats
+                yield player_data
+
+    def attributes(self) -> dict:
+        """Returns json-serializable attributes known without requesting match page again"""
+        return {name: value for name, value in self._attributes.items() if value is not None}
 
     def is_parsed(self) -> bool:
-        """Checks if match is already parsed and adds it to matches_config.json if not"""
-        try:
-            match_dict = Parser()._read_from_json("./configs/matches_config.json")
-        except:
-            logger.info("""Created ./configs/match_config.json for mapping""")
-            os.makedirs(os.path.dirname("./configs/"), exist_ok=True)
-            match_dict = {}
-        if self.match_id not in match_dict:
-            data = list(map(lambda _: _.replace("-", " "), self.teams_name)).copy()
-            data.extend([self.datetime, self.match_id, self.match_url])
-            match_dict[self.match_id] = data
-            Parser()._write_to_json(match_dict, "./configs/matches_config.json")
-            return False
-        return True
\ No newline at end of file
+        """Checks if match is already parsed and adds it to configs store if not"""
+        team1, team2 = map(lambda _: _.replace("-", " "), self.teams_name)
+        return not get_store().add_match(self.match_id, team1, team2, self.datetime, self.match_url)
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class TeamStatsMemo:
+    """Memoizes parsed team stats per key, i.e. (team url, time filter), so every team is parsed once per crawl.
+    With path set, entries are also stored on disk and reused across runs until they expire.
+    """
+
+    def __init__(self, ttl=6 * 60 * 60, path=None):
+        """
+        :param ttl: int, seconds after which memoized stats are parsed again
+        :param path: str, directory for persisting entries between runs, None keeps them in memory only
+        """
+        self.ttl = ttl
+        self.path = path
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, digest + ".json")
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """Returns memoized value for key or None if it is missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None and self.path is not None:
+            try:
+                with open(self._file(key), "r") as fp:
+                    entry = json.load(fp)
+                self._entries[key] = entry
+            except (OSError, ValueError):
+                return None
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+        return entry["value"]
+
+    def set(self, key, value):
+        entry = {"time": time.time(), "value": value}
+        self._entries[key] = entry
+        if self.path is not None:
+            path = self._file(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as fp:
+                json.dump(entry, fp)
+            os.replace(tmp_path, path)
+
+    def get_or_parse(self, key, parse, cacheable=lambda value: True):
+        """Returns memoized value for key, calls parse() once if it is missing, concurrent callers wait for it
+        :param key: hashable json-serializable key
+        :param parse: callable without arguments returning value
+        :param cacheable: callable deciding if returned value should be memoized, i.e. skip partial results
+        """
+        with self._key_lock(key):
+            value = self.get(key)
+            if value is None:
+                value = parse()
+                if cacheable(value):
+                    self.set(key, value)
+            return value
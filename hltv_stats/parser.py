@@ -1,11 +1,25 @@
 import json
-import random
-import time
-import requests
-from bs4 import BeautifulSoup
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
 from loguru import logger
+from .session import fetch, FetchError
+from .instrumentation import metrics
+
+
+def class_strainer(*classes) -> SoupStrainer:
+    """Returns SoupStrainer keeping elements having any of classes, also when element has several classes.
+    Regex is used as newer bs4 matches strainer against whole class attribute while parsing, i.e. "a b".
+    """
+    pattern = "|".join(map(re.escape, classes))
+    return SoupStrainer(attrs={"class": re.compile(rf"(^|\s)({pattern})($|\s)")})
+
 
 class Parser:
+    # BeautifulSoup tree builder and partial parsing switch, see configure_parser()
+    features = "html.parser"
+    partial = True
+
     @staticmethod
     def _write_to_json(data, path):
         with open(path, 'w+') as fp:
@@ -17,12 +31,25 @@ class Parser:
             return json.load(fp)
 
     @staticmethod
-    def _soup_from_url(url):
-        timesleep = random.uniform(0.35, 0.5)
-        time.sleep(timesleep)
-        r = requests.get(url)
-        soup = BeautifulSoup(r.text, "html.parser")
+    def _soup_from_url(url, parse_only: SoupStrainer = None):
+        """Returns soup of the page, with parse_only set only matching elements and their subtrees are built"""
+        r = fetch(url)
         if r.status_code != 200:
             logger.info("hltv request failed with status code: " + str(r.status_code))
-            raise
-        return soup
\ No newline at end of file
+            raise FetchError(url, r.status_code)
+        with metrics.span("soup", url=url):
+            soup = BeautifulSoup(r.text, Parser.features, parse_only=parse_only if Parser.partial else None)
+        return soup
+
+
+def configure_parser(features=None, partial=None):
+    """Configure how fetched pages are parsed
+    :param features: str, BeautifulSoup tree builder, i.e. "html.parser" (default) or "lxml" (faster, needs lxml)
+    :param partial: bool, build only page parts read by extractors (default), False builds whole documents
+    """
+    if features is not None:
+        if builder_registry.lookup(features) is None:
+            raise ValueError(f"BeautifulSoup tree builder {features!r} is not available, is it installed?")
+        Parser.features = features
+    if partial is not None:
+        Parser.partial = partial
@@ -0,0 +1,177 @@
+import sys
+from datetime import date
+from typing import NamedTuple, Optional
+from .aggregate import row_date
+
+
+def _text(value):
+    return sys.intern(value) if value is not None else None
+
+
+def _int(value):
+    try:
+        return int(value.replace(",", "").strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value.replace("%", "").strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def _scores(value):
+    scores = [_int(_) for _ in value.split("-")]
+    return (scores + [None, None])[0:2]
+
+
+class MatchRecord(NamedTuple):
+    """Row of HLTVTeam.parse_matches()"""
+    team: str
+    date: Optional[date]
+    event: str
+    opponent: str
+    map: str
+    rounds_won: Optional[int]
+    rounds_lost: Optional[int]
+    flag: str
+    team_cuid: str
+    time_filter: int
+    match_cuid: Optional[str] = None
+    map_stats_id: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row):
+        try:
+            played = row_date(row)
+        except ValueError:
+            played = None
+        won, lost = _scores(row["result"])
+        return cls(_text(row["team"]), played, _text(row["event"]), _text(row["opponent"]), _text(row["map"]),
+                   won, lost, _text(row["flag"].strip()), _text(row["team_cuid"]), int(row["time_filter"]),
+                   _text(row.get("match_cuid")), _int(row.get("map_stats_id")))
+
+
+class MapRecord(NamedTuple):
+    """Row of HLTVTeam.parse_maps(), percentages are kept as numbers from 0 to 100"""
+    team: str
+    map: str
+    wins: Optional[int]
+    draws: Optional[int]
+    losses: Optional[int]
+    win_rate: Optional[float]
+    total_rounds: Optional[int]
+    round_win_perc_after_first_kill: Optional[float]
+    round_win_perc_after_first_death: Optional[float]
+    team_cuid: str
+    time_filter: int
+    match_cuid: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row):
+        wins, draws, losses = ([_int(_) for _ in row["wins_draws_losses"].split("/")] + [None] * 3)[0:3]
+        return cls(_text(row["team"]), _text(row["map"]), wins, draws, losses, _float(row["win_rate"]),
+                   _int(row["total_rounds"]), _float(row.get("round_win_perc_after_first_kill")),
+                   _float(row.get("round_win_perc_after_first_death")), _text(row["team_cuid"]),
+                   int(row["time_filter"]), _text(row.get("match_cuid")))
+
+
+class PlayerRecord(NamedTuple):
+    """Row of HLTVTeam.parse_players()"""
+    team: str
+    player: str
+    maps: Optional[int]
+    rounds: Optional[int]
+    kd_diff: Optional[int]
+    kd: Optional[float]
+    rating: Optional[float]
+    team_cuid: str
+    time_filter: int
+    match_cuid: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(_text(row["team"]), _text(row["player"]), _int(row["maps"]), _int(row["rounds"]),
+                   _int(row["kd_diff"]), _float(row["kd"]), _float(row["rating"]), _text(row["team_cuid"]),
+                   int(row["time_filter"]), _text(row.get("match_cuid")))
+
+
+class EventRecord(NamedTuple):
+    """Row of HLTVTeam.parse_events(), placement is None for events derived from matches table"""
+    placement: Optional[str]
+    event: str
+    team: str
+    team_cuid: str
+    time_filter: int
+    match_cuid: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(_text(row.get("placement")), _text(row["event"]), _text(row["team"]), _text(row["team_cuid"]),
+                   int(row["time_filter"]), _text(row.get("match_cuid")))
+
+
+class InsightRecord(NamedTuple):
+    """Row of HLTVMatch.parse_analytics_summary()"""
+    team: str
+    indicator: str
+    insight: str
+    match_id: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(_text(row["team"]), _text(row["indicator"]), row["insight"], _text(row["match_id"]))
+
+
+class PickBanRecord(NamedTuple):
+    """Row of HLTVMatch.parse_pick_ban_stats(), percentages are kept as numbers from 0 to 100"""
+    analytics_map_name: str
+    team: str
+    pick_percentage: Optional[float]
+    ban_percentage: Optional[float]
+    win_percentage: Optional[float]
+    played: Optional[int]
+    comment: str
+    match_id: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(_text(row["analytics_map_name"]), _text(row["team"]),
+                   _float(row["analytics_map_stats_pick_percentage"]),
+                   _float(row["analytics_map_stats_ban_percentage"]),
+                   _float(row["analytics_map_stats_win_percentage"]), _int(row["analytics_map_stats_played"]),
+                   _text(row["analytics_map_stats_comment"]), _text(row["match_id"]))
+
+
+class HeadToHeadRecord(NamedTuple):
+    """Row of HLTVMatch.parse_head_to_head(), ratings are None where hltv shows no rating"""
+    player_team: str
+    player_nickname: str
+    rating_3_months: Optional[float]
+    rating_event: Optional[float]
+    match_id: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(_text(row["player_team"]), _text(row["player_nickname"]), _float(row["table_3_months"]),
+                   _float(row["table_event"]), _text(row["match_id"]))
+
+
+# record types by sink kind, see JSONLSink
+RECORD_TYPES = {
+    "team_matches_stats": MatchRecord,
+    "team_maps_stats": MapRecord,
+    "team_players_stats": PlayerRecord,
+    "team_events_stats": EventRecord,
+    "analytics_insights": InsightRecord,
+    "analytics_maps_stats": PickBanRecord,
+    "analytics_players_stats": HeadToHeadRecord,
+}
+
+
+def to_records(kind, rows):
+    """Converts parsed rows (list of dicts with string values) of given sink kind to typed records"""
+    record_type = RECORD_TYPES[kind]
+    return [record_type.from_row(row) for row in rows]
@@ -0,0 +1,330 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+from loguru import logger
+from .cache import CachedResponse, CacheMiss
+from .instrumentation import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` requests per second with bursts of up to `capacity` requests"""
+
+    def __init__(self, rate=2.5, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a token is available
+        :return: float, seconds spent waiting for the token
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class FetchError(Exception):
+    """Raised when page can't be fetched, status_code is None for connection errors"""
+
+    def __init__(self, url, status_code=None, message=None):
+        self.url = url
+        self.status_code = status_code
+        super().__init__(message or f"hltv request failed with status code {status_code}: {url}")
+
+
+class CircuitOpenError(FetchError):
+    """Raised without sending request while circuit breaker of the host is open"""
+
+
+class CircuitBreaker:
+    """Per host circuit breaker: opens after `threshold` consecutive failed requests (each counted once, after
+    its retries), rejects requests for `cooldown` seconds, then lets one trial request through (half-open)
+    and closes again on its success
+    """
+
+    def __init__(self, threshold=5, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def before_request(self, url):
+        with self._lock:
+            if self._opened is None:
+                return
+            if time.monotonic() - self._opened < self.cooldown or self._trial:
+                raise CircuitOpenError(url, message=f"circuit breaker is open, request skipped: {url}")
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._failures >= self.threshold:
+                if self._opened is None:
+                    logger.info(f"Circuit breaker opened after {self._failures} failures")
+                self._opened = time.monotonic()
+
+
+class AIMDController:
+    """Additive increase / multiplicative decrease of TokenBucket rate: every healthy response adds `increase`
+    requests per second up to max_rate, every 429/503 multiplies rate by `decrease` down to min_rate
+    """
+
+    def __init__(self, limiter, min_rate=0.2, max_rate=10.0, increase=0.05, decrease=0.5):
+        self.limiter = limiter
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.enabled = False
+        self._lock = threading.Lock()
+
+    def on_success(self):
+        if self.enabled:
+            with self._lock:
+                self.limiter.rate = min(self.max_rate, self.limiter.rate + self.increase)
+            metrics.observe("fetch.rate", self.limiter.rate)
+
+    def on_throttle(self):
+        if self.enabled:
+            with self._lock:
+                self.limiter.rate = max(self.min_rate, self.limiter.rate * self.decrease)
+            metrics.observe("fetch.rate", self.limiter.rate)
+            logger.info(f"Throttled by hltv, request rate lowered to {self.limiter.rate:.2f}/s")
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+_settings = {
+    "pool_size": 10,
+    "max_per_host": 4,
+    "timeout": 30,
+    "headers": {},
+    "cache": None,
+    "retries": 4,
+    "backoff": 1.0,
+    "max_backoff": 60.0,
+    "max_retry_after": 600.0,
+    "breaker_threshold": 5,
+    "breaker_cooldown": 60.0,
+}
+_limiter = TokenBucket()
+_controller = AIMDController(_limiter)
+_session = None
+_session_lock = threading.Lock()
+_host_slots = {}
+_breakers = {}
+
+
+def configure_fetch(rate=None, burst=None, pool_size=None, max_per_host=None, timeout=None, headers=None,
+                    cache=False, retries=None, backoff=None, max_backoff=None, max_retry_after=None, adaptive=None,
+                    min_rate=None, max_rate=None, breaker_threshold=None, breaker_cooldown=None):
+    """Configure shared fetch layer used by HLTVMatch, HLTVTeam and get_links_upcoming_matches
+    :param rate: float, allowed requests per second
+    :param burst: int, how many requests can be sent back to back after idle period
+    :param pool_size: int, number of keep-alive connections kept per host
+    :param max_per_host: int, maximum number of requests in flight to one host
+    :param timeout: float, request timeout in seconds
+    :param headers: dict, extra headers sent with every request
+    :param cache: ResponseCache to read/write pages through, None disables caching
+    :param retries: int, retries of 429, 5xx and connection errors
+    :param backoff: float, first retry delay in seconds, doubled on every retry, Retry-After header takes precedence
+    :param max_backoff: float, longest retry delay in seconds without Retry-After header
+    :param max_retry_after: float, longest wait in seconds requested by Retry-After header that is honoured
+    :param adaptive: bool, adjust rate between min_rate and max_rate: raise it while responses are healthy,
+        halve it on 429/503
+    :param min_rate: float, lowest requests per second with adaptive rate
+    :param max_rate: float, highest requests per second with adaptive rate
+    :param breaker_threshold: int, consecutive requests failing after all retries which open host circuit breaker
+    :param breaker_cooldown: float, seconds requests to host are rejected after circuit breaker opens
+    """
+    global _session
+    if rate is not None:
+        _limiter.rate = float(rate)
+    if burst is not None:
+        _limiter.capacity = float(burst)
+    if timeout is not None:
+        _settings["timeout"] = timeout
+    if cache is not False:
+        _settings["cache"] = cache
+    for name, value in (("retries", retries), ("backoff", backoff), ("max_backoff", max_backoff),
+                        ("max_retry_after", max_retry_after), ("breaker_threshold", breaker_threshold),
+                        ("breaker_cooldown", breaker_cooldown)):
+        if value is not None:
+            _settings[name] = value
+    if adaptive is not None:
+        _controller.enabled = adaptive
+    if min_rate is not None:
+        _controller.min_rate = min_rate
+    if max_rate is not None:
+        _controller.max_rate = max_rate
+    with _session_lock:
+        if max_per_host is not None:
+            _settings["max_per_host"] = max_per_host
+            _host_slots.clear()
+        if breaker_threshold is not None or breaker_cooldown is not None:
+            _breakers.clear()
+        if pool_size is not None:
+            _settings["pool_size"] = pool_size
+            if _session is not None:
+                _session.close()
+                _session = None
+        if headers is not None:
+            _settings["headers"] = dict(headers)
+            if _session is not None:
+                _session.headers.update(headers)
+
+
+def get_session() -> "requests.Session":
+    """Returns shared keep-alive session, creates it on first call"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests is imported on first request, so importing the package and serving from cache stay cheap
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=_settings["pool_size"], pool_maxsize=_settings["pool_size"])
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(_settings["headers"])
+            _session = session
+        return _session
+
+
+def _host_slot(url) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(_settings["max_per_host"])
+        return _host_slots[host]
+
+
+def _breaker(url) -> CircuitBreaker:
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(_settings["breaker_threshold"], _settings["breaker_cooldown"])
+        return _breakers[host]
+
+
+def _retry_delay(attempt, response=None) -> float:
+    """Exponential backoff with jitter capped by max_backoff, Retry-After header (seconds or http date)
+    is respected if it is longer, up to max_retry_after seconds
+    """
+    delay = min(_settings["max_backoff"], _settings["backoff"] * 2 ** attempt) * random.uniform(0.5, 1.0)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            try:
+                wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                wait = 0
+        delay = max(delay, min(wait, _settings["max_retry_after"]))
+    return delay
+
+
+def _get(url):
+    """Single GET through shared session, records metrics"""
+    import requests
+    with _host_slot(url):
+        waited = _limiter.acquire()
+        start = time.perf_counter()
+        try:
+            r = get_session().get(url, timeout=_settings["timeout"])
+        except requests.RequestException as e:
+            metrics.failure("fetch", e)
+            raise
+        latency = time.perf_counter() - start
+    size = len(r.content)
+    metrics.observe("fetch.rate_limit_wait", waited)
+    metrics.observe("fetch.latency", latency)
+    metrics.count("fetch.requests")
+    metrics.count("fetch.bytes", size)
+    metrics.count(f"fetch.status.{r.status_code}")
+    metrics.emit({"name": "fetch", "seconds": latency, "error": None, "url": url, "status": r.status_code,
+                  "bytes": size, "rate_limit_wait": waited})
+    return r
+
+
+def fetch(url) -> "requests.Response":
+    """GET url through shared session, waiting for rate limiter and a free per-host slot first.
+    Fresh pages from configured ResponseCache are returned without touching network.
+    429, 5xx and connection errors are retried with backoff, after the last retry the response is returned
+    (connection error is raised). Hosts failing repeatedly are skipped by circuit breaker with CircuitOpenError.
+    Latency, bytes, status codes, retries and rate limiter waits are recorded in metrics as fetch.*
+    """
+    cache = _settings["cache"]
+    if cache is not None:
+        text = cache.get(url)
+        if text is not None:
+            metrics.count("fetch.cache_hits")
+            return CachedResponse(url, text)
+        metrics.count("fetch.cache_misses")
+        if cache.offline:
+            raise CacheMiss(url)
+    import requests
+    breaker = _breaker(url)
+    try:
+        breaker.before_request(url)
+    except CircuitOpenError:
+        metrics.count("fetch.circuit_open")
+        raise
+    attempt = 0
+    while True:
+        r, error = None, None
+        try:
+            r = _get(url)
+        except requests.RequestException as e:
+            error = e
+        if error is None and r.status_code not in RETRY_STATUSES:
+            breaker.record_success()
+            _controller.on_success()
+            break
+        if r is not None and r.status_code in THROTTLE_STATUSES:
+            _controller.on_throttle()
+        if attempt >= _settings["retries"]:
+            # one failure per request, a single bad page does not open the breaker of its host
+            breaker.record_failure()
+            if error is not None:
+                raise error
+            break
+        delay = _retry_delay(attempt, r)
+        metrics.count("fetch.retries")
+        metrics.observe("fetch.backoff", delay)
+        logger.info(f"Request failed ({r.status_code if r is not None else repr(error)}), "
+                    f"retrying in {delay:.1f}s: {url}")
+        time.sleep(delay)
+        attempt += 1
+    if cache is not None and r.status_code == 200:
+        cache.put(url, r.text)
+    return r
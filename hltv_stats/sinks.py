@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from loguru import logger
+
+
+class JSONLSink:
+    """Appends records of every kind to <path>/<kind>.jsonl, one json object per line"""
+
+    def __init__(self, path="./output"):
+        self.path = path
+        self._files = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, kind, records):
+        """Append records (list of dicts) of given kind, i.e. "analytics_insights" or "team_maps_stats" """
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with self._lock:
+            if kind not in self._files:
+                self._files[kind] = open(os.path.join(self.path, f"{kind}.jsonl"), "a")
+            self._files[kind].write(lines)
+            self._files[kind].flush()
+
+    def flush(self):
+        """Records are flushed on every write, kept for the same interface as ParquetSink"""
+        with self._lock:
+            for fp in self._files.values():
+                fp.flush()
+
+    def after_flush(self, callback):
+        """Calls callback right away, written records are already flushed"""
+        callback()
+
+    def close(self):
+        with self._lock:
+            for fp in self._files.values():
+                fp.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetSink:
+    """Buffers records per kind and writes every batch_size of them to <path>/<kind>/part-*.parquet,
+    requires pyarrow. Records of one kind may miss optional fields (i.e. match_cuid), they are stored as nulls.
+    Crawlers store matches and jobs as done with after_flush(), so work is not marked done while its records
+    are only buffered and a killed worker does not lose them.
+    """
+
+    def __init__(self, path="./output", batch_size=10000, max_delay=300):
+        """
+        :param path: str, directory with one <kind>/ directory of parquet parts per kind
+        :param batch_size: int, buffered records of one kind written as one part
+        :param max_delay: float, seconds records may stay buffered, all kinds are written by the next write after it,
+            None buffers until batch_size or flush()
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetSink requires pyarrow, install it with `pip install pyarrow`")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._batches = {}
+        self._buffered_since = None
+        # [kinds with records buffered when callback was added, callback]
+        self._callbacks = []
+        self._parts = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, kind, records):
+        """Buffer records (list of dicts) of given kind, full batches are written to disk"""
+        with self._lock:
+            batch = self._batches.setdefault(kind, [])
+            batch.extend(records)
+            if self._buffered_since is None:
+                self._buffered_since = time.monotonic()
+            if self.max_delay is not None and time.monotonic() - self._buffered_since >= self.max_delay:
+                ready = self.__flush_all()
+            elif len(batch) >= self.batch_size:
+                ready = self.__flush(kind)
+            else:
+                ready = []
+        _run_callbacks(ready)
+
+    def after_flush(self, callback):
+        """Calls callback once all records written so far are on disk, immediately if none are buffered"""
+        with self._lock:
+            kinds = {kind for kind, batch in self._batches.items() if batch}
+            if kinds:
+                self._callbacks.append([kinds, callback])
+                return
+        callback()
+
+    def __flush(self, kind):
+        """Writes buffered records of kind, returns callbacks waiting for no other kind"""
+        batch = self._batches.pop(kind, None)
+        if not self._batches:
+            self._buffered_since = None
+        if not batch:
+            return []
+        os.makedirs(os.path.join(self.path, kind), exist_ok=True)
+        self._parts += 1
+        part_path = os.path.join(self.path, kind, f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._parts}.parquet")
+        # Table.from_pylist() takes columns from the first record only, fields missing in some records become nulls
+        names = dict.fromkeys(name for record in batch for name in record)
+        table = self._pa.Table.from_pydict({name: [record.get(name) for record in batch] for name in names})
+        self._pq.write_table(table, part_path)
+        for kinds, _ in self._callbacks:
+            kinds.discard(kind)
+        ready = [callback for kinds, callback in self._callbacks if not kinds]
+        self._callbacks = [entry for entry in self._callbacks if entry[0]]
+        return ready
+
+    def __flush_all(self):
+        ready = []
+        for kind in list(self._batches):
+            ready.extend(self.__flush(kind))
+        return ready
+
+    def flush(self):
+        """Write all buffered records"""
+        with self._lock:
+            ready = self.__flush_all()
+        _run_callbacks(ready)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _run_callbacks(callbacks):
+    """Runs after_flush() callbacks outside of sink lock, failing callback doesn't stop the others"""
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.info(f"Failed after_flush callback {callback!r}: {e!r}")
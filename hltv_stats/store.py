@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+from loguru import logger
+
+
+def thread_connection(local, path) -> sqlite3.Connection:
+    """Returns autocommit connection to sqlite database at path kept in threading.local() for current thread,
+    sqlite connections can't be shared between threads
+    """
+    con = getattr(local, "connection", None)
+    if con is None:
+        con = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # rollback journal, WAL needs shared memory which processes on different hosts can't share
+        con.execute("PRAGMA journal_mode=DELETE")
+        local.connection = con
+    return con
+
+
+class ConfigStore:
+    """SQLite backed mapping of parsed teams and matches, replaces ./configs/team_config.json
+    and ./configs/matches_config.json. Lookups and inserts are indexed by primary key and safe to run
+    from several threads and processes at once.
+    """
+
+    def __init__(self, path="./configs/hltv.sqlite3"):
+        """
+        :param path: str, sqlite database file, json configs from the same directory are imported on creation
+        """
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        con = self._connection()
+        con.execute("CREATE TABLE IF NOT EXISTS teams (name TEXT PRIMARY KEY, cuid TEXT NOT NULL)")
+        con.execute("CREATE TABLE IF NOT EXISTS matches (match_id TEXT PRIMARY KEY, team1 TEXT, team2 TEXT, "
+                    "datetime TEXT, url TEXT)")
+        self.__import_json_configs(os.path.dirname(os.path.abspath(path)))
+
+    def _connection(self) -> sqlite3.Connection:
+        return thread_connection(self._local, self.path)
+
+    def __import_json_configs(self, configs_dir):
+        con = self._connection()
+        teams_path = os.path.join(configs_dir, "team_config.json")
+        if os.path.exists(teams_path) and con.execute("SELECT 1 FROM teams LIMIT 1").fetchone() is None:
+            with open(teams_path, "r") as fp:
+                teams = json.load(fp)
+            con.executemany("INSERT OR IGNORE INTO teams VALUES (?, ?)", teams.items())
+            logger.info(f"Imported {len(teams)} teams from {teams_path}")
+        matches_path = os.path.join(configs_dir, "matches_config.json")
+        if os.path.exists(matches_path) and con.execute("SELECT 1 FROM matches LIMIT 1").fetchone() is None:
+            with open(matches_path, "r") as fp:
+                matches = json.load(fp)
+            con.executemany("INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?, ?)",
+                            ([match_id] + data[0:2] + [data[2], data[4]] for match_id, data in matches.items()))
+            logger.info(f"Imported {len(matches)} matches from {matches_path}")
+
+    def team_cuid(self, team_name, new_cuid) -> str:
+        """Returns unique id for team name, stores new_cuid() for unknown team names"""
+        con = self._connection()
+        row = con.execute("SELECT cuid FROM teams WHERE name = ?", (team_name,)).fetchone()
+        if row is None:
+            con.execute("INSERT OR IGNORE INTO teams VALUES (?, ?)", (team_name, new_cuid()))
+            row = con.execute("SELECT cuid FROM teams WHERE name = ?", (team_name,)).fetchone()
+        return row[0]
+
+    def add_match(self, match_id, team1, team2, datetime, url) -> bool:
+        """Stores match, returns False if match_id was already stored"""
+        cursor = self._connection().execute("INSERT OR IGNORE INTO matches VALUES (?, ?, ?, ?, ?)",
+                                            (match_id, team1, team2, datetime, url))
+        return cursor.rowcount == 1
+
+    def has_match(self, match_id) -> bool:
+        return self._connection().execute("SELECT 1 FROM matches WHERE match_id = ?",
+                                          (match_id,)).fetchone() is not None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def configure_store(path):
+    """Use sqlite database at path for team and match configs"""
+    global _store
+    with _store_lock:
+        _store = ConfigStore(path)
+
+
+def get_store() -> ConfigStore:
+    """Returns shared ConfigStore, ./configs/hltv.sqlite3 by default"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+        return _store
@@ -1,9 +1,18 @@
-import os
 from datetime import datetime, timedelta
-from cuid import cuid
-from .parser import Parser
+from bs4 import SoupStrainer
+from .parser import Parser, class_strainer
+from .store import get_store
+from .records import MatchRecord, MapRecord, PlayerRecord, EventRecord
+from .instrumentation import metrics
+from .aggregate import filter_window, map_stats, map_stats_id, event_stats, unique_rows
 from loguru import logger
 BASE_URL = "https://www.hltv.org"
+STATS_KINDS = ("matches", "maps", "players", "events")
+# stats kinds window_stats() can derive from all-time matches table instead of requesting them per window
+DERIVABLE_KINDS = ("maps", "events")
+# page parts read by extractors, the rest of the document is not built while parsing
+TABLES_ONLY = SoupStrainer("table")
+MAPS_PAGE_ONLY = class_strainer("map-pool-map-name", "stats-rows")
 
 
 class HLTVTeam(Parser):
@@ -16,18 +25,10 @@ class HLTVTeam(Parser):
 
     def __get_cuid(self, team_name):
         """
-        Returns unique id for team name. If team name is not in team_config.json, creates new id and writes to file.
+        Returns unique id for team name. If team name is not in configs store, creates new id and stores it.
         """
-        try:
-            team_dict = self._read_from_json("./configs/team_config.json")
-        except:
-            logger.info("""Created ./configs/team_config.json for mapping {"team name" : "unique id"}""")
-            os.makedirs(os.path.dirname("./configs/"), exist_ok=True)
-            team_dict = {}
-        if team_name not in team_dict:
-            team_dict[team_name] = cuid()
-            self._write_to_json(team_dict, "./configs/team_config.json")
-        return team_dict[team_name]
+        from cuid import cuid
+        return get_store().team_cuid(team_name, cuid)
 
     @staticmethod
     def __get_time_filter(months=0):
@@ -39,56 +40,167 @@ class HLTVTeam(Parser):
         end_date = datetime.strftime(date, '%Y-%m-%d')
         return f'?startDate={start_date}&endDate={end_date}'
 
-    def parse_all_stats(self, time_filter: int, filename: str = None):
+    @staticmethod
+    def __get_date_filter(start_date):
+        """ Returns filter for url from start_date (YYYY-MM-DD) till today"""
+        end_date = datetime.strftime(datetime.now(), '%Y-%m-%d')
+        return f'?startDate={start_date}&endDate={end_date}'
+
+    def collect_stats(self, time_filter: int) -> dict:
+        """ Parse all stats kinds for team, skipping the ones which failed
+        :param time_filter: 0 - all time, 1 - last month, 2 - last 2 months, 3 - last 3 months
+        :return: dict of stats kind ("matches", "maps", "players", "events") -> list of dicts
+        """
+        stats = {}
+        for kind in STATS_KINDS:
+            try:
+                stats[kind] = getattr(self, f"parse_{kind}")(time_filter)
+            except Exception as e:
+                logger.info(f"Failed parse_{kind}(): {e!r}")
+        return stats
+
+    def _with_match_id(self, rows):
+        """Returns copy of rows tagged with current match_id"""
+        if self.match_id is None:
+            return [{k: v for k, v in row.items() if k != 'match_cuid'} for row in rows]
+        return [dict(row, match_cuid=self.match_id) for row in rows]
+
+    def stats(self, time_filter: int, memo=None) -> dict:
+        """ Same as collect_stats(), but reuses stats from memo and tags them with current match_id
+        :param time_filter: 0 - all time, 1 - last month, 2 - last 2 months, 3 - last 3 months
+        :param memo: TeamStatsMemo or None
+        :return: dict of stats kind -> list of dicts
+        """
+        if memo is None:
+            return self.collect_stats(time_filter)
+        stats = memo.get_or_parse((self.team_url, time_filter), lambda: self.collect_stats(time_filter),
+                                  cacheable=lambda value: len(value) == len(STATS_KINDS))
+        return {kind: self._with_match_id(rows) for kind, rows in stats.items()}
+
+    @metrics.timed("team.parse_all_stats")
+    def parse_all_stats(self, time_filter: int, filename: str = None, memo=None, sink=None):
         """ Parse all stats for team
         :param time_filter: 0 - all time, 1 - last month, 2 - last 2 months, 3 - last 3 months
         :param filename: str, filename for saving json
+        :param memo: TeamStatsMemo, reuse stats already parsed for this team and time_filter
+        :param sink: JSONLSink or ParquetSink, records are written as team_<kind>_stats
         :return: tuple of list of dicts with stats
         """
+        stats = self.stats(time_filter, memo)
         output = []
-        try:
-            matches_stats = self.parse_matches(time_filter)
-            output.append(matches_stats)
+        for kind, rows in stats.items():
+            output.append(rows)
             if filename is not None:
-                self._write_to_json(matches_stats, f"{filename}_matches_stats.json")
-        except:
-            logger.info("Failed parse_matches()")
-        try:
-            maps_stats = self.parse_maps(time_filter)
-            output.append(maps_stats)
-            if filename is not None:
-                self._write_to_json(maps_stats, f"{filename}_maps_stats.json")
-        except:
-            logger.info("Failed parse_maps()")
-        try:
-            players_stats = self.parse_players(time_filter)
-            output.append(players_stats)
-            if filename is not None:
-                self._write_to_json(players_stats, f"{filename}_players_stats.json")
-        except:
-            logger.info("Failed parse_players()")
-        try:
-            events_stats = self.parse_events(time_filter)
-            output.append(events_stats)
-            if filename is not None:
-                self._write_to_json(events_stats, f"{filename}_events_stats.json")
-        except:
-            logger.info("Failed parse_events()")
+                self._write_to_json(rows, f"{filename}_{kind}_stats.json")
+            if sink is not None:
+                sink.write(f"team_{kind}_stats", rows)
         return tuple(output)
 
-    def parse_matches(self, time_filter=3, filename=None):
+    def _memoized(self, memo, kind, time_filter, parse):
+        if memo is None:
+            return parse()
+        return self._with_match_id(memo.get_or_parse((self.team_url, kind, time_filter), parse))
+
+    def _tagged(self, record, time_filter):
+        row = {"team": self.team_name, **record, "team_cuid": self.team_cuid, "time_filter": str(time_filter)}
+        if self.match_id is not None:
+            row['match_cuid'] = self.match_id
+        return row
+
+    @metrics.timed("team.window_stats")
+    def window_stats(self, months, memo=None, history=None, derive=()) -> dict:
+        """ Parse all-time matches once and filter matches stats of every window locally.
+        Maps, players and events stats are parsed per window, unless their kind is in derive.
+        Derived maps stats have no first kill/death round win rates, derived events stats have no placement.
+        :param months: list of time filters, i.e. [1, 3, 6]
+        :param memo: TeamStatsMemo, reuse pages already parsed for this team
+        :param history: MatchHistory, if set, all-time matches are synced incrementally, see sync_matches()
+        :param derive: tuple of DERIVABLE_KINDS derived from matches table instead of requested per window
+        :return: dict of time filter -> dict of stats kind -> list of dicts
+        """
+        unknown = set(derive) - set(DERIVABLE_KINDS)
+        if unknown:
+            raise ValueError(f"Can't derive {sorted(unknown)} from matches table, choose from {DERIVABLE_KINDS}")
+        derived = {"maps": map_stats, "events": event_stats}
+        try:
+            if history is not None:
+                matches = self._memoized(memo, "matches", 0, lambda: self.sync_matches(history))
+            else:
+                matches = unique_rows(self._memoized(memo, "matches", 0, lambda: self.parse_matches(0)))
+        except Exception as e:
+            logger.info(f"Failed parse_matches(): {e!r}")
+            matches = None
+        windows = {}
+        for m in months:
+            stats = {}
+            rows = filter_window(matches, m, now=datetime.now()) if matches is not None else None
+            for kind in STATS_KINDS:
+                if kind == "matches":
+                    if rows is not None:
+                        stats[kind] = [dict(row, time_filter=str(m)) for row in rows]
+                elif kind in derive:
+                    if rows is not None:
+                        stats[kind] = [self._tagged(record, m) for record in derived[kind](rows)]
+                else:
+                    try:
+                        stats[kind] = self._memoized(memo, kind, m, lambda: getattr(self, f"parse_{kind}")(m))
+                    except Exception as e:
+                        logger.info(f"Failed parse_{kind}(): {e!r}")
+            windows[m] = stats
+        return windows
+
+    def save_windows(self, windows: dict, filename: str = None, sink=None):
+        """ Save stats of several windows, rows of all windows go to one file per stats kind
+        :param windows: dict of time filter -> dict of stats kind -> list of dicts
+        :param filename: str, filename prefix for saving json
+        :param sink: JSONLSink or ParquetSink, records are written as team_<kind>_stats
+        """
+        for kind in STATS_KINDS:
+            if any(kind in stats for stats in windows.values()):
+                rows = [row for stats in windows.values() for row in stats.get(kind, [])]
+                if filename is not None:
+                    self._write_to_json(rows, f"{filename}_{kind}_stats.json")
+                if sink is not None:
+                    sink.write(f"team_{kind}_stats", rows)
+
+    def parse_windows(self, months, filename: str = None, memo=None, history=None, sink=None, derive=()):
+        """ Parse stats for several time filters with a single all-time matches request, see window_stats()
+        :param months: list of time filters, i.e. [1, 3, 6]
+        :param filename: str, filename for saving json, rows of all windows are saved together
+        :param memo: TeamStatsMemo, reuse pages already parsed for this team
+        :param history: MatchHistory, if set, all-time matches are synced incrementally
+        :param sink: JSONLSink or ParquetSink, records are written as team_<kind>_stats
+        :param derive: tuple of DERIVABLE_KINDS derived from matches table instead of requested per window
+        :return: dict of time filter -> tuple of list of dicts with stats
+        """
+        windows = self.window_stats(months, memo, history, derive)
+        self.save_windows(windows, filename, sink)
+        return {m: tuple(stats.values()) for m, stats in windows.items()}
+
+    @metrics.timed("team.parse_matches")
+    def parse_matches(self, time_filter=3, filename=None, typed=False):
         """
         Parse played matches stats for team;
         :param time_filter: int, 0 = all time, 1 - 1 month, 6 - 6 months, ...
         :param filename: str, filename to save json
+        :param typed: bool, return typed records with numbers converted, see records.py
         :return: list of dicts with matches stats
         """
 
+        matches_stats = list(self.iter_matches(time_filter))
+        if filename is not None:
+            self._write_to_json(matches_stats, f"{filename}.json")
+        return [MatchRecord.from_row(row) for row in matches_stats] if typed else matches_stats
+
+    def iter_matches(self, time_filter=3):
+        """Yields played matches stats for team as they are parsed, see parse_matches()"""
+        return self.__iter_matches_page(self.__get_time_filter(time_filter), time_filter)
+
+    def __iter_matches_page(self, query, time_filter):
         matches_url = "/".join(self.sliced_url[0:3]) + "/matches/" + "/".join(self.sliced_url[3:5])
-        start_url = BASE_URL + matches_url + self.__get_time_filter(time_filter)
-        soup = self._soup_from_url(start_url)
+        start_url = BASE_URL + matches_url + query
+        soup = self._soup_from_url(start_url, TABLES_ONLY)
 
-        matches_stats = []
         rows = soup.find_all('tr', attrs={"class": "group-1 first"}) + \
                soup.find_all('tr', attrs={"class": "group-2 first"}) + \
                soup.find_all('tr', attrs={"class": "group-1"}) + \
@@ -111,29 +223,54 @@ class HLTVTeam(Parser):
                 "map": norm(row_map),
                 "result": norm(row_result),
                 "flag": row_flag.text,
+                "map_stats_id": map_stats_id(row_date.get("href")),
                 "team_cuid": self.team_cuid,
                 "time_filter": str(time_filter)
             }
             if self.match_id is not None:
                 row_data['match_cuid'] = self.match_id
-            matches_stats.append(row_data)
+            yield row_data
+
+    @metrics.timed("team.sync_matches")
+    def sync_matches(self, history, filename=None):
+        """
+        Incrementally sync all-time played matches for team, only matches since previous sync are requested;
+        :param history: MatchHistory, storage of already synced matches
+        :param filename: str, filename to save json
+        :return: list of dicts with all-time matches stats, latest first
+        """
+        synced, _ = history.load(self.team_cuid)
+        today = datetime.strftime(datetime.now(), '%Y-%m-%d')
+        if synced is None:
+            rows = self.parse_matches(0)
+        else:
+            # last synced day is requested again, matches played later that day were not listed yet
+            rows = list(self.__iter_matches_page(self.__get_date_filter(synced), 0))
+        matches_stats = self._with_match_id(history.merge(self.team_cuid, rows, today))
         if filename is not None:
             self._write_to_json(matches_stats, f"{filename}.json")
         return matches_stats
 
-    def parse_maps(self, time_filter=3, filename=None):
+    @metrics.timed("team.parse_maps")
+    def parse_maps(self, time_filter=3, filename=None, typed=False):
         """
         Parse played maps stats for team;
         :param time_filter: int, 0 - all time, 1 - 1 month, 6 - 6 months, ...
         :param filename: str, filename to save json
+        :param typed: bool, return typed records with numbers converted, see records.py
         :return: list of dicts with maps stats
         """
+        maps_stats = list(self.iter_maps(time_filter))
+        if filename is not None:
+            self._write_to_json(maps_stats, f"{filename}.json")
+        return [MapRecord.from_row(row) for row in maps_stats] if typed else maps_stats
 
+    def iter_maps(self, time_filter=3):
+        """Yields played maps stats for team as they are parsed, see parse_maps()"""
         maps_url = "/".join(self.sliced_url[0:3]) + "/maps/" + "/".join(self.sliced_url[3:5])
         start_url = BASE_URL + maps_url + self.__get_time_filter(time_filter)
-        soup = self._soup_from_url(start_url)
+        soup = self._soup_from_url(start_url, MAPS_PAGE_ONLY)
 
-        maps_stats = []
         map_names = soup.find_all("div", attrs={'class': 'map-pool-map-name'})
         map_stats = soup.find_all("div", attrs={'class': 'stats-rows standard-box'})
 
@@ -153,25 +290,30 @@ class HLTVTeam(Parser):
             }
             if self.match_id is not None:
                 map_data['match_cuid'] = self.match_id
-            maps_stats.append(map_data)
-        if filename is not None:
-            self._write_to_json(maps_stats, f"{filename}.json")
-        return maps_stats
+            yield map_data
 
-    def parse_players(self, time_filter=3, filename=None):
+    @metrics.timed("team.parse_players")
+    def parse_players(self, time_filter=3, filename=None, typed=False):
         """
         Parse players stats for team;
         :param time_filter: int, 0 - all times, 1 - 1 months, 6 - 6 months, ...
         :param filename: str, filename to save json
+        :param typed: bool, return typed records with numbers converted, see records.py
         :return: list of dicts with players stats
         """
+        players_stats = list(self.iter_players(time_filter))
+        if filename is not None:
+            self._write_to_json(players_stats, f"{filename}.json")
+        return [PlayerRecord.from_row(row) for row in players_stats] if typed else players_stats
 
+    def iter_players(self, time_filter=3):
+        """Yields players stats for team as they are parsed, see parse_players()"""
         players_url = "/".join(self.sliced_url[0:3]) + "/players/" + "/".join(self.sliced_url[3:5])
         start_url = BASE_URL + players_url + self.__get_time_filter(time_filter)
-        soup = self._soup_from_url(start_url)
-        players_stats = []
+        soup = self._soup_from_url(start_url, TABLES_ONLY)
         players = soup.find_all("tr")
-        for i in range(1, 10):
+        # header row and up to 9 players, teams with fewer players have shorter tables
+        for i in range(1, min(10, len(players))):
             try:
                 player = list(map(lambda _: _.text, players[i].find_all('td')))
                 player_data = {
@@ -187,24 +329,30 @@ class HLTVTeam(Parser):
                 }
                 if self.match_id is not None:
                     player_data['match_cuid'] = self.match_id
-                players_stats.append(player_data)
-            except:
-                pass
-        if filename is not None:
-            self._write_to_json(players_stats, f"{filename}.json")
-        return players_stats
+            except IndexError as e:
+                metrics.failure("team.parse_players.rows", e)
+                continue
+            yield player_data
 
-    def parse_events(self, time_filter=3, filename=None):
+    @metrics.timed("team.parse_events")
+    def parse_events(self, time_filter=3, filename=None, typed=False):
         """Parse events stats for team
         :param time_filter: int, 0 - all times, 1 - 1 months, 6 - 6 months, ...
         :param filename: str, filename to save json
+        :param typed: bool, return typed records with numbers converted, see records.py
         :return: list of dicts with events stats
         """
+        events_stats = list(self.iter_events(time_filter))
+        if filename is not None:
+            self._write_to_json(events_stats, f"{filename}.json")
+        return [EventRecord.from_row(row) for row in events_stats] if typed else events_stats
+
+    def iter_events(self, time_filter=3):
+        """Yields events stats for team as they are parsed, see parse_events()"""
         events_url = "/".join(self.sliced_url[0:3]) + "/events/" + "/".join(self.sliced_url[3:5])
         start_url = BASE_URL + events_url + self.__get_time_filter(time_filter)
-        soup = self._soup_from_url(start_url)
+        soup = self._soup_from_url(start_url, TABLES_ONLY)
 
-        events_stats = []
         events = soup.find_all("tr")
         for i in range(1, len(events)):
             event = list(map(lambda _: _.text.lower(), events[i].find_all('td')))
@@ -217,8 +365,4 @@ class HLTVTeam(Parser):
             }
             if self.match_id is not None:
                 event_data['match_cuid'] = self.match_id
-            events_stats.append(event_data)
-
-        if filename is not None:
-            self._write_to_json(events_stats, f"{filename}.json")
-        return events_stats
\ No newline at end of file
+            yield event_data
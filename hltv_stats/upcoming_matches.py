@@ -1,62 +1,111 @@
 import os
-from hltv_stats import Parser, HLTVMatch, HLTVTeam
-BASE_URL = "https://www.hltv.org"
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .parser import Parser, class_strainer
+from .match import HLTVMatch
+from .team import HLTVTeam
+from .memo import TeamStatsMemo
+from .store import get_store
 from loguru import logger
+BASE_URL = "https://www.hltv.org"
+# page parts read by get_upcoming_matches(), the rest of the document is not built while parsing
+LISTING_ONLY = class_strainer("upcomingMatchesSection", "liveMatch")
 
-def get_links_upcoming_matches(include_live=True):
-    """Get links to random number of live and upcoming(!!!) matches
+
+def get_upcoming_matches(include_live=True):
+    """Get live and upcoming matches as HLTVMatch objects filled from /matches listing,
+    match pages are requested only for attributes missing from listing, see HLTVMatch.from_listing()
     :param include_live: bool, include live matches
     """
     matches_page_url = "https://www.hltv.org/matches"
-    soup = Parser._soup_from_url(url=matches_page_url)
-    matches = soup.find("div", class_="upcomingMatchesSection") \
-        .find_all('a', class_="match a-reset", href=True)
-    links = []
-    for match in matches:
-        team_count = match.parent.find_all('div', class_="matchTeamName text-ellipsis")
-        if len(team_count) < 2:
-            logger.info(match['href'])
-            logger.info("Invalid match, waiting for teams")
-        else:
-            links.append(match['href'])
-    if include_live:
-        lives = soup.find_all("div", class_="liveMatch")
-        lives = list(map(lambda _: _.a['href'], lives))
-        links.extend(lives)
-    return links
-
-
-def parse_upcoming_matches(months, with_teams=False):
-    """Parse upcoming matches and save to tree of directories in output/
-    :param months: list of months to parse, i.e. [1,3] <=> [last month, last 3 months]
-    :param with_teams: bool, if True, parse teams' statistic as well
+    soup = Parser._soup_from_url(url=matches_page_url, parse_only=LISTING_ONLY)
+    return HLTVMatch.from_listing(soup, include_live=include_live)
+
+
+def get_links_upcoming_matches(include_live=True):
+    """Get links to random number of live and upcoming(!!!) matches
+    :param include_live: bool, include live matches
     """
+    return [match.match_url for match in get_upcoming_matches(include_live)]
+
+
+def output_paths(with_teams=True):
+    """Creates output/matches/ (and output/teams/ with with_teams) in current directory, returns both paths"""
     dir_path = os.path.join(os.getcwd(), "output/")
     matches_path = dir_path + "matches/"
     teams_path = dir_path + "teams/"
-    os.makedirs(os.path.dirname(matches_path), exist_ok=True)
+    os.makedirs(matches_path, exist_ok=True)
     if with_teams:
-        os.makedirs(os.path.dirname(teams_path), exist_ok=True)
-    matches_link = get_links_upcoming_matches()
-    for ind, match_link in enumerate(matches_link):
-        logger.info("parsing :", match_link)
-        match = HLTVMatch(BASE_URL + match_link)
-        if match.is_parsed():
-            logger.info("Match already parsed, skipping")
-            continue
+        os.makedirs(teams_path, exist_ok=True)
+    return matches_path, teams_path
+
+
+def _parse_match(match, matches_path, sink):
+    """Parse analytics center of a single match, returns None if match was parsed before"""
+    logger.info(f"parsing : {match.match_url}")
+    if get_store().has_match(match.match_id):
+        logger.info("Match already parsed, skipping")
+        return None
+    # stored only after analytics were saved, so interrupted match is parsed again on next run
+    if sink is not None:
+        match.parse_analytics_center(sink=sink)
+        sink.after_flush(match.is_parsed)
+    else:
         match.parse_analytics_center(filename=f"{matches_path}/{match.match_id}")
-        teams = match.teams_link
-        if with_teams:
-            for m in months:
-                team1 = HLTVTeam(teams[0])
-                team1.match_id = match.match_id
-                team1.parse_all_stats(time_filter=m,
-                                      filename=f"{teams_path}/{match.match_id}_{team1.team_name.replace('-', '_')}")
-                team2 = HLTVTeam(teams[1])
-                team2.match_id = match.match_id
-                team2.parse_all_stats(time_filter=m,
-                                      filename=f"{teams_path}/{match.match_id}_{team2.team_name.replace('-', '_')}")
-
-
-if __name__ == '__main__':
-    parse_upcoming_matches(months=[3], with_teams=True)
\ No newline at end of file
+        if match.is_parsed():
+            logger.info("Match was parsed concurrently")
+    return match
+
+
+def _parse_team_stats(team_link, match_id, months, teams_path, memo, derive_windows, history, sink):
+    """Parse all stats of a team for every time filter in months and assign them to match_id"""
+    team = HLTVTeam(team_link)
+    team.match_id = match_id
+    if derive_windows:
+        derive = () if derive_windows is True else tuple(derive_windows)
+        windows = team.window_stats(months, memo=memo, history=history, derive=derive)
+    else:
+        windows = {m: team.stats(m, memo=memo) for m in months}
+    if sink is not None:
+        team.save_windows(windows, sink=sink)
+    else:
+        team.save_windows(windows, filename=f"{teams_path}/{match_id}_{team.team_name.replace('-', '_')}")
+
+
+def parse_upcoming_matches(months, with_teams=False, workers=1, memo=None, derive_windows=False, history=None,
+                           sink=None):
+    """Parse upcoming matches and save to tree of directories in output/
+    :param months: list of months to parse, i.e. [1,3] <=> [last month, last 3 months]
+    :param with_teams: bool, if True, parse teams' statistic as well
+    :param workers: int, number of matches/teams parsed concurrently,
+        requests per host are additionally capped by configure_fetch(max_per_host=...)
+    :param memo: TeamStatsMemo, shares team stats between matches, by default stats are reused within this run only
+    :param derive_windows: bool or tuple of DERIVABLE_KINDS, if set, parse all-time matches once per team and
+        filter matches of every window from it, kinds in tuple are derived from it as well, see HLTVTeam.window_stats()
+    :param history: MatchHistory, with derive_windows, sync all-time matches incrementally instead of full request
+    :param sink: JSONLSink or ParquetSink, if set, records are written to sink instead of json files in output/
+    """
+    matches_path, teams_path = output_paths(with_teams)
+    if memo is None:
+        memo = TeamStatsMemo()
+    matches = get_upcoming_matches()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        match_futures = {executor.submit(_parse_match, match, matches_path, sink): match.match_url
+                         for match in matches}
+        team_futures = {}
+        for future in as_completed(match_futures):
+            try:
+                match = future.result()
+            except Exception as e:
+                logger.info(f"Failed to parse {match_futures[future]}: {e!r}")
+                continue
+            if match is None or not with_teams:
+                continue
+            for team_link in match.teams_link:
+                team_future = executor.submit(_parse_team_stats, team_link, match.match_id, months,
+                                              teams_path, memo, derive_windows, history, sink)
+                team_futures[team_future] = team_link
+        for future in as_completed(team_futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.info(f"Failed to parse team {team_futures[future]}: {e!r}")
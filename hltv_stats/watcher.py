@@ -0,0 +1,166 @@
+import heapq
+import itertools
+import threading
+import time
+from loguru import logger
+from .instrumentation import metrics
+from .memo import TeamStatsMemo
+from .upcoming_matches import get_upcoming_matches, output_paths, _parse_team_stats
+
+
+class MatchWatcher:
+    """Long-running alternative to periodic parse_upcoming_matches() runs: polls /matches listing, diffs it with
+    previous snapshot and schedules analytics center fetch of every new or rescheduled match `lead_time` seconds
+    before its start. Between polls only scheduled fetches are requested.
+    """
+
+    def __init__(self, lead_time=30 * 60, poll=5 * 60, months=(3,), with_teams=False, memo=None,
+                 derive_windows=False, history=None, sink=None, retry_delay=60):
+        """
+        :param lead_time: int, seconds before match start its analytics are fetched
+        :param poll: int, seconds between /matches listing requests
+        :param months: list of months to parse team stats for, see parse_upcoming_matches()
+        :param with_teams: bool, if True, parse teams' statistic together with analytics
+        :param memo: TeamStatsMemo, team stats are reused between matches while fresh
+        :param derive_windows: bool or tuple of DERIVABLE_KINDS, see parse_upcoming_matches()
+        :param history: MatchHistory, see HLTVTeam.window_stats()
+        :param sink: JSONLSink or ParquetSink, if set, records are written to sink instead of json files in output/
+        :param retry_delay: int, seconds before failed fetch is retried, doubled after every failure of the match
+        """
+        self.lead_time = lead_time
+        self.poll = poll
+        self.months = list(months)
+        self.with_teams = with_teams
+        self.memo = memo if memo is not None else TeamStatsMemo()
+        self.derive_windows = derive_windows
+        self.history = history
+        self.sink = sink
+        self.retry_delay = retry_delay
+        self.matches_path, self.teams_path = output_paths(with_teams)
+        # match_id -> (match url, start timestamp) from previous poll
+        self.snapshot = {}
+        # match_id -> start timestamp analytics were fetched for
+        self.fetched = {}
+        self._matches = {}
+        self._due = {}
+        # match_id -> number of consecutive failed fetches
+        self._failures = {}
+        self._queue = []
+        self._order = itertools.count()
+        self._stopped = threading.Event()
+
+    def diff(self, matches):
+        """Returns matches which are new or changed their link or start time since previous snapshot,
+        matches missing from listing (started or cancelled) are unscheduled and forgotten
+        """
+        snapshot = {match.match_id: (match.match_url, match.timestamp) for match in matches}
+        changed = [match for match in matches if self.snapshot.get(match.match_id) != snapshot[match.match_id]]
+        for match_id in set(self.snapshot) - set(snapshot):
+            self._due.pop(match_id, None)
+            self._matches.pop(match_id, None)
+            self._failures.pop(match_id, None)
+            self.fetched.pop(match_id, None)
+        self.snapshot = snapshot
+        return changed
+
+    def schedule(self, match, now=None):
+        """Schedules analytics fetch lead_time before match start, immediately if it is closer than that"""
+        now = time.time() if now is None else now
+        if self.fetched.get(match.match_id) == match.timestamp:
+            return
+        due = max(now, match.timestamp - self.lead_time) if match.timestamp is not None else now
+        self._push(match, due)
+        metrics.count("watcher.scheduled")
+        logger.info(f"Match {match.match_id} scheduled at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(due))}")
+
+    def _push(self, match, due):
+        self._matches[match.match_id] = match
+        self._due[match.match_id] = due
+        heapq.heappush(self._queue, (due, next(self._order), match.match_id))
+
+    def retry(self, match, now=None):
+        """Reschedules failed fetch with exponential backoff while match start is still ahead,
+        otherwise forgets match, so it is scheduled as new one if next poll still lists it
+        """
+        now = time.time() if now is None else now
+        failures = self._failures.get(match.match_id, 0) + 1
+        due = now + self.retry_delay * 2 ** (failures - 1)
+        if match.timestamp is not None and due < match.timestamp:
+            self._failures[match.match_id] = failures
+            self._push(match, due)
+            metrics.count("watcher.retries")
+            logger.info(f"Match {match.match_id} fetch retry {failures} at "
+                        f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(due))}")
+        else:
+            self._failures.pop(match.match_id, None)
+            self.snapshot.pop(match.match_id, None)
+
+    def poll_listing(self, now=None):
+        """Requests /matches listing once and schedules new or changed matches"""
+        metrics.count("watcher.polls")
+        for match in self.diff(get_upcoming_matches(include_live=False)):
+            self.schedule(match, now)
+
+    def run_due(self, now=None):
+        """Fetches analytics of all matches due by now, returns number of fetched matches"""
+        now = time.time() if now is None else now
+        done = 0
+        while self._queue and self._queue[0][0] <= now:
+            due, _, match_id = heapq.heappop(self._queue)
+            # rescheduled or removed matches leave stale entries in the heap
+            if self._due.get(match_id) != due:
+                continue
+            del self._due[match_id]
+            match = self._matches.pop(match_id)
+            try:
+                self.fetch(match)
+                self.fetched[match_id] = match.timestamp
+                self._failures.pop(match_id, None)
+                done += 1
+            except Exception as e:
+                logger.info(f"Failed to parse {match.match_url}: {e!r}")
+                self.retry(match, now)
+        return done
+
+    @metrics.timed("watcher.fetch")
+    def fetch(self, match):
+        """Parses analytics center of match (and its teams with with_teams) and stores it as parsed"""
+        logger.info(f"parsing : {match.match_url}")
+        if self.sink is not None:
+            match.parse_analytics_center(sink=self.sink)
+            self.sink.after_flush(match.is_parsed)
+        else:
+            match.parse_analytics_center(filename=f"{self.matches_path}/{match.match_id}")
+            match.is_parsed()
+        if self.with_teams:
+            for team_link in match.teams_link:
+                try:
+                    _parse_team_stats(team_link, match.match_id, self.months, self.teams_path, self.memo,
+                                      self.derive_windows, self.history, self.sink)
+                except Exception as e:
+                    logger.info(f"Failed to parse team {team_link}: {e!r}")
+
+    def run(self, duration=None):
+        """Polls listing and fetches scheduled matches until stop() is called or duration seconds passed"""
+        end = time.time() + duration if duration is not None else None
+        next_poll = time.time()
+        while not self._stopped.is_set():
+            now = time.time()
+            if end is not None and now >= end:
+                break
+            if now >= next_poll:
+                try:
+                    self.poll_listing(now)
+                except Exception as e:
+                    logger.info(f"Failed to poll upcoming matches: {e!r}")
+                next_poll = now + self.poll
+            self.run_due()
+            wake = [next_poll]
+            if self._queue:
+                wake.append(self._queue[0][0])
+            if end is not None:
+                wake.append(end)
+            self._stopped.wait(max(0.0, min(wake) - time.time()))
+
+    def stop(self):
+        self._stopped.set()
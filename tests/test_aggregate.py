@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from hltv_stats.aggregate import event_stats, filter_window, map_stats, map_stats_id, row_outcome, unique_rows
+
+NOW = datetime(2026, 10, 18)
+
+
+def row(date, map_name="mirage", result="16 - 10", flag="W", event="iem", opponent="faze", row_id=None):
+    output = {"date": date, "event": event, "opponent": opponent, "map": map_name, "result": result, "flag": flag}
+    if row_id is not None:
+        output["map_stats_id"] = row_id
+    return output
+
+
+def test_map_stats_id():
+    assert map_stats_id("/stats/matches/mapstatsid/158063/natus-vincere-vs-faze") == "158063"
+    assert map_stats_id(None) is None
+
+
+def test_unique_rows_keeps_maps_with_same_fields():
+    first, second = row("01/10/26", row_id="1"), row("01/10/26", row_id="2")
+    assert unique_rows([first, second, dict(first)]) == [first, second]
+
+
+def test_unique_rows_merges_rows_without_id_into_rows_with_id():
+    synced = row("01/10/26", row_id="1")
+    stored = row("01/10/26")
+    assert unique_rows([synced, stored, dict(stored)]) == [synced]
+
+
+def test_unique_rows_orders_latest_first():
+    rows = [row("01/09/26", row_id="1"), row("15/10/26", row_id="2"), row("bad", row_id="3")]
+    assert [_["map_stats_id"] for _ in unique_rows(rows)] == ["2", "1", "3"]
+
+
+def test_filter_window():
+    rows = [row("17/10/26"), row("18/09/26"), row("17/09/26"), row("01/01/20"), row("bad")]
+    assert filter_window(rows, 1, now=NOW) == rows[0:2]
+    assert filter_window(rows, 0, now=NOW) == rows
+
+
+def test_row_outcome():
+    assert row_outcome(row("01/10/26", flag=" W ")) == "w"
+    assert row_outcome(row("01/10/26", flag="T", result="15 - 15")) == "d"
+    assert row_outcome(row("01/10/26", flag="", result="10 - 16")) == "l"
+
+
+def test_map_stats():
+    rows = [row("01/10/26", "inferno", "16 - 10", "W"), row("02/10/26", "mirage", "12 - 16", "L"),
+            row("03/10/26", "mirage", "16 - 14", "W"), row("04/10/26", "mirage", "15 - 15", "D")]
+    assert map_stats(rows) == [
+        {"map": "mirage", "wins_draws_losses": "1 / 1 / 1", "win_rate": "33.3%", "total_rounds": "88"},
+        {"map": "inferno", "wins_draws_losses": "1 / 0 / 0", "win_rate": "100.0%", "total_rounds": "26"},
+    ]
+
+
+def test_event_stats_latest_first():
+    rows = [row("01/10/26", event="blast"), row("05/10/26", event="iem"), row("03/10/26", event="blast")]
+    assert event_stats(rows) == [{"event": "iem"}, {"event": "blast"}]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from hltv_stats.dataset import DatasetBuilder
+
+INSIGHTS = {"1": [{"team": "faze", "indicator": "plus"}, {"team": "faze", "indicator": "minus"},
+                  {"team": "vitality", "indicator": "plus"}],
+            "2": [{"team": "g2", "indicator": "plus"}, {"team": "heroic", "indicator": "minus"}]}
+MAPS = {"1": [{"team": "faze", "map": "mirage", "win_rate": "60.0%", "total_rounds": "300", "time_filter": "1"},
+              {"team": "vitality", "map": "mirage", "win_rate": "45.5%", "total_rounds": "250", "time_filter": "1"}],
+        "2": [{"team": "g2", "map": "nuke", "win_rate": "50.0%", "total_rounds": "100", "time_filter": "1"},
+              {"team": "heroic", "map": "nuke", "win_rate": "70.0%", "total_rounds": "120", "time_filter": "1"}]}
+
+
+def write_json_tree(output):
+    (output / "matches").mkdir(parents=True)
+    (output / "teams").mkdir()
+    for match_id, rows in INSIGHTS.items():
+        (output / "matches" / f"{match_id}_insights.json").write_text(json.dumps(rows))
+    for match_id, rows in MAPS.items():
+        for team in {row["team"] for row in rows}:
+            team_rows = [dict(row, match_cuid=match_id) for row in rows if row["team"] == team]
+            (output / "teams" / f"{match_id}_{team}_maps_stats.json").write_text(json.dumps(team_rows))
+
+
+def write_jsonl(output):
+    output.mkdir()
+    with open(output / "analytics_insights.jsonl", "w") as fp:
+        for match_id, rows in INSIGHTS.items():
+            fp.writelines(json.dumps(dict(row, match_id=match_id)) + "\n" for row in rows)
+    with open(output / "team_maps_stats.jsonl", "w") as fp:
+        for match_id, rows in MAPS.items():
+            fp.writelines(json.dumps(dict(row, match_cuid=match_id)) + "\n" for row in rows)
+
+
+def test_sink_records_build_same_rows_as_json_files(tmp_path):
+    write_json_tree(tmp_path / "json")
+    write_jsonl(tmp_path / "jsonl")
+    from_json = DatasetBuilder(str(tmp_path / "json"), str(tmp_path / "json_dataset")).build()
+    from_jsonl = DatasetBuilder(str(tmp_path / "jsonl"), str(tmp_path / "jsonl_dataset")).build()
+    assert list(from_json.index) == ["1", "2"]
+    assert from_json.loc["1", "t1_insights_plus"] == 1
+    assert from_json.loc["1", "diff_maps_win_rate_mirage_1m"] == pytest.approx(14.5)
+    assert from_jsonl.equals(from_json[from_jsonl.columns])
+    assert set(from_jsonl.columns) == set(from_json.columns)
+
+
+def test_parquet_records_build_same_rows_as_jsonl(tmp_path):
+    pytest.importorskip("pyarrow")
+    from hltv_stats.sinks import ParquetSink
+    write_jsonl(tmp_path / "jsonl")
+    sink = ParquetSink(str(tmp_path / "parquet"))
+    for kind in ("analytics_insights", "team_maps_stats"):
+        with open(tmp_path / "jsonl" / f"{kind}.jsonl") as fp:
+            sink.write(kind, [json.loads(line) for line in fp])
+    sink.flush()
+    from_jsonl = DatasetBuilder(str(tmp_path / "jsonl"), str(tmp_path / "jsonl_dataset")).build()
+    from_parquet = DatasetBuilder(str(tmp_path / "parquet"), str(tmp_path / "parquet_dataset")).build()
+    assert from_parquet.equals(from_jsonl[from_parquet.columns])
+
+
+def test_appended_jsonl_records_rebuild_only_their_match(tmp_path, monkeypatch):
+    write_jsonl(tmp_path / "jsonl")
+    builder = DatasetBuilder(str(tmp_path / "jsonl"), str(tmp_path / "dataset"))
+    built = builder.build()
+    loaded = []
+    load_frames = builder._load_frames
+    monkeypatch.setattr(builder, "_load_frames", lambda files, match_ids: loaded.append(set(match_ids)) or
+                        load_frames(files, match_ids))
+    assert builder.build().equals(built)
+    assert loaded == []
+    with open(tmp_path / "jsonl" / "analytics_insights.jsonl", "a") as fp:
+        fp.write(json.dumps({"team": "g2", "indicator": "plus", "match_id": "2"}) + "\n")
+        # record still being written by sink is read on next build
+        fp.write('{"team": "faze", "indicator": "plus", "match_id": "1"')
+    rebuilt = builder.build()
+    assert loaded == [{"2"}]
+    assert rebuilt.loc["2", "t1_insights_plus"] == 2
+    assert rebuilt.loc["1"].equals(built.loc["1"])
@@ -0,0 +1,115 @@
+import pytest
+
+from hltv_stats import jobs
+from hltv_stats.jobs import JobQueue, LeaseLost
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time.time() of job queue, advanced by tests instead of sleeping until leases expire"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(jobs.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), lease_time=60, max_attempts=3, retry_delay=10)
+
+
+def test_expired_lease_is_resumed_from_checkpoint(queue, clock):
+    queue.put("team", {"url": "/4608/natus-vincere"})
+    job = queue.lease("dead")
+    queue.checkpoint(job, {"windows": {"1": {"matches": []}}})
+    assert queue.lease("alive") is None
+    clock[0] += 61
+    resumed = queue.lease("alive")
+    assert resumed.id == job.id
+    assert resumed.attempts == 2
+    assert resumed.checkpoint == {"windows": {"1": {"matches": []}}}
+    queue.complete(resumed)
+    assert queue.counts() == {"done": 1}
+
+
+def test_heartbeat_keeps_lease(queue, clock):
+    queue.put("match", {"url": "/matches/1/a-vs-b"})
+    job = queue.lease("worker")
+    clock[0] += 50
+    assert queue.heartbeat("worker") == 1
+    clock[0] += 50
+    assert queue.lease("other") is None
+    queue.complete(job)
+
+
+def test_lease_lost_after_takeover(queue, clock):
+    queue.put("match", {"url": "/matches/1/a-vs-b"})
+    job = queue.lease("dead")
+    clock[0] += 61
+    queue.lease("alive")
+    assert queue.heartbeat("dead") == 0
+    with pytest.raises(LeaseLost):
+        queue.checkpoint(job, {"windows": {}})
+    with pytest.raises(LeaseLost):
+        queue.complete(job)
+    assert queue.counts() == {"leased": 1}
+
+
+def test_expired_lease_fails_after_max_attempts(queue, clock):
+    queue.put("match", {"url": "/matches/1/a-vs-b"})
+    for owner in ("a", "b", "c"):
+        assert queue.lease(owner) is not None
+        clock[0] += 61
+    assert queue.lease("d") is None
+    assert queue.counts() == {"failed": 1}
+    assert queue.retry_failed() == 1
+    assert queue.lease("d").attempts == 1
+
+
+def test_resumed_team_job_skips_checkpointed_windows(queue, clock, monkeypatch):
+    parsed, saved = [], []
+
+    class Team:
+        def __init__(self, url):
+            self.team_name = url.split("/")[2]
+            self.match_id = None
+
+        def stats(self, time_filter, memo=None):
+            parsed.append(time_filter)
+            return {"matches": [{"time_filter": str(time_filter)}]}
+
+        def save_windows(self, windows, filename=None, sink=None):
+            saved.append(windows)
+
+    monkeypatch.setattr("hltv_stats.team.HLTVTeam", Team)
+    queue.put("team", {"url": "/4608/natus-vincere", "match_id": "1", "months": [1, 3],
+                       "derive_windows": False})
+    job = queue.lease("dead")
+    queue.checkpoint(job, {"windows": {1: {"matches": [{"time_filter": "1"}]}}})
+    clock[0] += 61
+    resumed = queue.lease("alive")
+    output = {"memo": None, "history": None, "sink": None, "teams_path": "unused"}
+    jobs.JOB_HANDLERS[resumed.kind](queue, resumed, output)
+    assert parsed == [3]
+    assert list(saved[0]) == [1, 3]
+    assert queue.lease("other") is None
+
+
+def test_worker_completes_job_after_sink_flush(queue, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    class Sink:
+        def __init__(self):
+            self.callbacks = []
+
+        def after_flush(self, callback):
+            self.callbacks.append(callback)
+
+        def flush(self):
+            assert queue.counts() == {"leased": 1}
+            for callback in self.callbacks:
+                callback()
+            self.callbacks = []
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, "match", lambda queue, job, output: None)
+    queue.put("match", {"url": "/matches/1/a-vs-b"})
+    assert jobs.run_worker(queue, sink=Sink(), poll=0) == {"done": 1}
@@ -0,0 +1,77 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import analytics_page, listing_page, match_page, match_slug
+from hltv_stats.cache import CacheMiss
+from hltv_stats.match import HLTVMatch
+from hltv_stats.session import FetchError
+
+MATCH_ID = 2370000
+MATCH_URL = f"/matches/{MATCH_ID}/{match_slug(MATCH_ID)}"
+
+
+class Pages:
+    """Stub of Parser._soup_from_url serving fixture pages, or raising queued errors first"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.errors = []
+        self.urls = []
+
+    def __call__(self, url, parse_only=None):
+        self.urls.append(url)
+        if self.errors:
+            raise self.errors.pop(0)
+        for path, page in self.pages.items():
+            if url.endswith(path):
+                return BeautifulSoup(page, "html.parser")
+        raise FetchError(url, 404)
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    pages = Pages({MATCH_URL: match_page(MATCH_ID), f"/betting/analytics/{MATCH_ID}/{match_slug(MATCH_ID)}":
+                   analytics_page(MATCH_ID)})
+    monkeypatch.setattr(HLTVMatch, "_soup_from_url", staticmethod(pages))
+    return pages
+
+
+def test_failed_attribute_load_is_retried(pages):
+    match = HLTVMatch(MATCH_URL)
+    pages.errors.append(CacheMiss(MATCH_URL))
+    with pytest.raises(CacheMiss):
+        match.teams_name
+    assert match.teams_name[0] == match_slug(MATCH_ID).split("-vs-")[0]
+    assert match.analytics_center_link.endswith(f"/betting/analytics/{MATCH_ID}/{match_slug(MATCH_ID)}")
+    assert len(pages.urls) == 2
+
+
+def test_listing_matches_need_no_match_page(pages):
+    matches = HLTVMatch.from_listing(BeautifulSoup(listing_page([MATCH_ID], live=0), "html.parser"))
+    match = matches[0]
+    assert match.teams_link is not None
+    assert match.timestamp == 1676206800
+    assert len(match.parse_analytics_center()[0]) > 0
+    assert not any(url.endswith(MATCH_URL) for url in pages.urls)
+
+
+def test_missing_analytics_center_is_parsed_without_analytics(pages):
+    match = HLTVMatch(f"/matches/1/{match_slug(1)}", attributes={
+        "teams_name": ["a", "b"], "analytics_center_link": f"https://www.hltv.org/betting/analytics/1/{match_slug(1)}"})
+    written = []
+
+    class Sink:
+        def write(self, kind, rows):
+            written.append(kind)
+
+    assert match.parse_analytics_center(sink=Sink()) == ([], [], [])
+    assert list(match.iter_analytics()) == []
+    assert written == []
+
+
+def test_analytics_server_errors_are_raised(pages):
+    match = HLTVMatch(MATCH_URL)
+    match.analytics_center_link = "https://www.hltv.org/betting/analytics/2370000/x"
+    pages.errors.append(FetchError(match.analytics_center_link, 503))
+    with pytest.raises(FetchError):
+        match.parse_analytics_center()
@@ -0,0 +1,144 @@
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from hltv_stats import session
+from hltv_stats.session import CircuitOpenError, fetch
+
+URL = "https://www.hltv.org/matches"
+
+
+def response(status, headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r.headers.update(headers or {})
+    r._content = b"page"
+    r.url = URL
+    return r
+
+
+class StubSession:
+    """Returns queued responses (or raises queued exceptions) instead of sending requests"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = 0
+
+    def get(self, url, timeout=None):
+        self.requests += 1
+        r = self.responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = StubSession()
+    sleeps = []
+    clock = [1000.0]
+    monkeypatch.setattr(session, "_session", stub)
+    monkeypatch.setattr(session._limiter, "acquire", lambda: 0.0)
+    monkeypatch.setattr(session.time, "sleep", sleeps.append)
+    monkeypatch.setattr(session.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(session.random, "uniform", lambda a, b: 1.0)
+    monkeypatch.setattr(session, "_settings", dict(session._settings, cache=None, retries=3, backoff=1.0,
+                                                   max_backoff=60.0, max_retry_after=600.0,
+                                                   breaker_threshold=2, breaker_cooldown=30.0))
+    monkeypatch.setattr(session, "_breakers", {})
+    stub.sleeps = sleeps
+    stub.clock = clock
+    return stub
+
+
+def test_throttled_request_is_retried(stub):
+    stub.responses = [response(429), response(429), response(200)]
+    assert fetch(URL).status_code == 200
+    assert stub.requests == 3
+    assert stub.sleeps == [1.0, 2.0]
+
+
+def test_retry_after_longer_than_max_backoff_is_honoured(stub):
+    stub.responses = [response(429, {"Retry-After": "120"}), response(503, {"Retry-After": "6000"}), response(200)]
+    assert fetch(URL).status_code == 200
+    assert stub.sleeps == [120.0, 600.0]
+
+
+def test_retry_after_http_date(stub, monkeypatch):
+    monkeypatch.setattr(session.time, "time", lambda: 1_700_000_000.0)
+    stub.responses = [response(429, {"Retry-After": formatdate(1_700_000_090.0, usegmt=True)}), response(200)]
+    fetch(URL)
+    assert stub.sleeps == [90.0]
+
+
+def test_not_found_is_not_retried(stub):
+    stub.responses = [response(404)]
+    assert fetch(URL).status_code == 404
+    assert stub.requests == 1
+    assert stub.sleeps == []
+
+
+def test_last_response_is_returned_after_retries(stub):
+    stub.responses = [response(500)] * 4
+    assert fetch(URL).status_code == 500
+    assert stub.requests == 4
+
+
+def test_connection_error_is_raised_after_retries(stub):
+    stub.responses = [requests.ConnectionError("down")] * 4
+    with pytest.raises(requests.ConnectionError):
+        fetch(URL)
+    assert stub.requests == 4
+
+
+def test_single_failed_page_does_not_open_breaker(stub):
+    stub.responses = [response(500)] * 4 + [response(200)]
+    fetch(URL)
+    assert fetch(URL).status_code == 200
+
+
+def test_breaker_opens_after_threshold_failed_requests(stub):
+    stub.responses = [response(500)] * 8
+    fetch(URL)
+    fetch(URL)
+    with pytest.raises(CircuitOpenError):
+        fetch("https://www.hltv.org/stats/teams")
+    assert stub.requests == 8
+    stub.responses = [response(200)]
+    assert fetch("https://other.example/page").status_code == 200
+
+
+def test_half_open_trial_closes_breaker(stub):
+    stub.responses = [response(500)] * 8
+    fetch(URL)
+    fetch(URL)
+    stub.clock[0] += 31
+    breaker = session._breaker(URL)
+    breaker.before_request(URL)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request(URL)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        fetch(URL)
+    stub.clock[0] += 31
+    # trial request retries like any other request and closes breaker on success
+    stub.responses = [response(503), response(200)]
+    assert fetch(URL).status_code == 200
+    stub.responses = [response(200)]
+    assert fetch(URL).status_code == 200
+
+
+def test_adaptive_rate(stub, monkeypatch):
+    controller = session.AIMDController(session.TokenBucket(rate=4.0), min_rate=1.0, max_rate=5.0, increase=0.5)
+    controller.enabled = True
+    monkeypatch.setattr(session, "_controller", controller)
+    stub.responses = [response(429), response(200)]
+    fetch(URL)
+    assert controller.limiter.rate == 2.5
+    for _ in range(2):
+        controller.on_throttle()
+    assert controller.limiter.rate == 1.0
+    for _ in range(10):
+        controller.on_success()
+    assert controller.limiter.rate == 5.0
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from hltv_stats.sinks import JSONLSink, ParquetSink
+
+
+def test_jsonl_sink_appends_records(tmp_path):
+    with JSONLSink(str(tmp_path)) as sink:
+        sink.write("team_maps_stats", [{"team": "a"}])
+        sink.write("team_maps_stats", [{"team": "b"}])
+    with open(tmp_path / "team_maps_stats.jsonl") as fp:
+        assert [json.loads(line) for line in fp] == [{"team": "a"}, {"team": "b"}]
+
+
+def test_parquet_sink_keeps_fields_missing_from_first_record(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    with ParquetSink(str(tmp_path)) as sink:
+        sink.write("team_maps_stats", [{"team": "a"}, {"team": "b", "match_cuid": "42"}])
+    table = pq.read_table(str(tmp_path / "team_maps_stats"))
+    assert table.to_pylist() == [{"team": "a", "match_cuid": None}, {"team": "b", "match_cuid": "42"}]
+
+
+def test_parquet_sink_runs_callbacks_after_their_records_are_written(tmp_path):
+    pytest.importorskip("pyarrow")
+    done = []
+    sink = ParquetSink(str(tmp_path), batch_size=3, max_delay=None)
+    sink.after_flush(lambda: done.append("empty"))
+    sink.write("analytics_insights", [{"team": "a"}])
+    sink.write("analytics_maps_stats", [{"team": "a"}])
+    sink.after_flush(lambda: done.append("match"))
+    sink.write("analytics_insights", [{"team": "b"}, {"team": "c"}])
+    assert done == ["empty"]
+    sink.write("analytics_maps_stats", [{"team": "b"}, {"team": "c"}])
+    assert done == ["empty", "match"]
+    assert len(list((tmp_path / "analytics_insights").iterdir())) == 1
+
+
+def test_parquet_sink_writes_buffered_records_after_max_delay(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    clock = [0.0]
+    monkeypatch.setattr("hltv_stats.sinks.time.monotonic", lambda: clock[0])
+    done = []
+    sink = ParquetSink(str(tmp_path), max_delay=60)
+    sink.write("analytics_insights", [{"team": "a"}])
+    sink.after_flush(lambda: done.append("match"))
+    clock[0] += 61
+    sink.write("analytics_maps_stats", [{"team": "a"}])
+    assert done == ["match"]
+    assert sorted(_.name for _ in tmp_path.iterdir()) == ["analytics_insights", "analytics_maps_stats"]
+
+
+def test_jsonl_sink_runs_callbacks_right_away(tmp_path):
+    done = []
+    with JSONLSink(str(tmp_path)) as sink:
+        sink.write("analytics_insights", [{"team": "a"}])
+        sink.after_flush(lambda: done.append("match"))
+        assert done == ["match"]
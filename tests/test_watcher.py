@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pytest
+
+from hltv_stats import watcher as watcher_module
+from hltv_stats.watcher import MatchWatcher
+
+KICKOFF = 100_000
+
+
+def match(match_id, timestamp=KICKOFF):
+    return SimpleNamespace(match_id=match_id, match_url=f"/matches/{match_id}/a-vs-b", timestamp=timestamp)
+
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    listing = []
+    monkeypatch.setattr(watcher_module, "get_upcoming_matches", lambda include_live=False: list(listing))
+    watcher = MatchWatcher(lead_time=600, poll=300, retry_delay=60)
+    watcher.listing = listing
+    watcher.fetches = []
+    watcher.failing = set()
+
+    def fetch(match):
+        watcher.fetches.append((match.match_id, match.timestamp))
+        if match.match_id in watcher.failing:
+            raise RuntimeError("analytics center is down")
+
+    watcher.fetch = fetch
+    return watcher
+
+
+def test_new_match_is_fetched_lead_time_before_kickoff(watcher):
+    watcher.listing[:] = [match("1")]
+    watcher.poll_listing(now=0)
+    assert watcher.run_due(now=KICKOFF - 601) == 0
+    assert watcher.run_due(now=KICKOFF - 600) == 1
+    watcher.poll_listing(now=KICKOFF - 300)
+    assert watcher.run_due(now=KICKOFF - 300) == 0
+    assert watcher.fetches == [("1", KICKOFF)]
+
+
+def test_rescheduled_match_skips_stale_heap_entry(watcher):
+    watcher.listing[:] = [match("1")]
+    watcher.poll_listing(now=0)
+    watcher.listing[:] = [match("1", KICKOFF + 3600)]
+    watcher.poll_listing(now=300)
+    assert len(watcher._queue) == 2
+    assert watcher.run_due(now=KICKOFF - 600) == 0
+    assert watcher.run_due(now=KICKOFF + 3000) == 1
+    assert watcher.fetches == [("1", KICKOFF + 3600)]
+
+
+def test_fetched_match_is_fetched_again_after_time_change(watcher):
+    watcher.listing[:] = [match("1")]
+    watcher.poll_listing(now=KICKOFF - 600)
+    watcher.run_due(now=KICKOFF - 600)
+    watcher.listing[:] = [match("1", KICKOFF + 600)]
+    watcher.poll_listing(now=KICKOFF - 300)
+    watcher.run_due(now=KICKOFF)
+    assert watcher.fetches == [("1", KICKOFF), ("1", KICKOFF + 600)]
+
+
+def test_match_missing_from_listing_is_unscheduled(watcher):
+    watcher.listing[:] = [match("1"), match("2")]
+    watcher.poll_listing(now=0)
+    watcher.listing[:] = [match("2")]
+    watcher.poll_listing(now=300)
+    assert watcher.run_due(now=KICKOFF) == 1
+    assert watcher.fetches == [("2", KICKOFF)]
+    assert set(watcher.snapshot) == {"2"}
+
+
+def test_failed_fetch_is_retried_with_backoff_before_kickoff(watcher):
+    watcher.listing[:] = [match("1")]
+    watcher.failing.add("1")
+    watcher.poll_listing(now=0)
+    now = KICKOFF - 600
+    watcher.run_due(now=now)
+    retries = []
+    while watcher._due:
+        now = watcher._due["1"]
+        retries.append(now)
+        watcher.run_due(now=now)
+    assert retries == [KICKOFF - 540, KICKOFF - 420, KICKOFF - 180]
+    assert len(watcher.fetches) == 4
+
+
+def test_failed_match_is_dropped_from_snapshot_after_kickoff(watcher):
+    watcher.listing[:] = [match("1", KICKOFF)]
+    watcher.failing.add("1")
+    watcher.poll_listing(now=KICKOFF - 30)
+    watcher.run_due(now=KICKOFF - 30)
+    assert "1" not in watcher.snapshot
+    assert watcher._due == {}
+    # match still listed on next poll is scheduled again as a new one
+    watcher.failing.clear()
+    watcher.poll_listing(now=KICKOFF + 10)
+    assert watcher.run_due(now=KICKOFF + 10) == 1
+    assert watcher.fetched == {"1": KICKOFF}
+
+
+def test_successful_retry_resets_backoff(watcher):
+    watcher.listing[:] = [match("1")]
+    watcher.failing.add("1")
+    watcher.poll_listing(now=0)
+    watcher.run_due(now=KICKOFF - 600)
+    watcher.failing.clear()
+    assert watcher.run_due(now=KICKOFF - 540) == 1
+    assert watcher._failures == {}